@@ -10,10 +10,18 @@ DB_DIR=/app/src/database
 
 # Only root can chown; when already running as a non-root user (e.g. compose
 # `user:` override) skip straight to exec.
+AS_APP_USER=""
 if [ "$(id -u)" = "0" ]; then
     mkdir -p "$DB_DIR"
     chown -R appuser:appuser "$DB_DIR"
-    exec gosu appuser "$@"
+    AS_APP_USER="gosu appuser"
 fi
 
-exec "$@"
+# Create tables, run migrations and bootstrap the admin account once, before
+# the server starts, so the serving workers can skip it on import.
+if [ "$1" = "gunicorn" ]; then
+    $AS_APP_USER flask init-db
+    export FRIDGENOTES_SKIP_INIT=1
+fi
+
+exec $AS_APP_USER "$@"
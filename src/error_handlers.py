@@ -1,16 +1,29 @@
-from flask import jsonify
+import json
+
+from flask import Response, jsonify
+
+def _json_body(payload):
+    """Serialize a constant error payload once, in the same form jsonify() produces."""
+    return (json.dumps(payload, separators=(',', ':')) + '\n').encode()
+
+# Bodies for the fixed-message errors; 404s from scanners are the most common
+# error response, so they skip per-request dict building and serialization.
+_404_BODY = _json_body({'error': 'Not Found'})
+_403_BODY = _json_body({'error': 'Forbidden'})
+_413_BODY = _json_body({'error': 'File too large'})
+_500_BODY = _json_body({'error': 'Internal Server Error'})
 
 def handle_404(err):
     """Handles 404 Not Found errors."""
-    return jsonify({'error': 'Not Found'}), 404
+    return Response(_404_BODY, 404, mimetype='application/json')
 
 def handle_403(err):
     """Handles 403 Forbidden errors."""
-    return jsonify({'error': 'Forbidden'}), 403
+    return Response(_403_BODY, 403, mimetype='application/json')
 
 def handle_500(err):
     """Handles 500 Internal Server Error."""
-    return jsonify({'error': 'Internal Server Error'}), 500
+    return Response(_500_BODY, 500, mimetype='application/json')
 
 def handle_permission_error(err):
     """Handles PermissionError exceptions."""
@@ -22,7 +35,7 @@ def handle_invalid_input(err):
 
 def handle_413(err):
     """Handles request bodies exceeding MAX_CONTENT_LENGTH (e.g. oversized uploads)."""
-    return jsonify({'error': 'File too large'}), 413
+    return Response(_413_BODY, 413, mimetype='application/json')
 
 def handle_conflict(err):
     """Handles ConflictError (concurrent update) as 409, returning current state."""
@@ -36,10 +49,14 @@ def register_error_handlers(app):
     """Registers all error handlers with the Flask app."""
     from src.datetime_utils import InvalidInput
     from src.exceptions import ConflictError
-    app.register_error_handler(404, handle_404)
-    app.register_error_handler(403, handle_403)
-    app.register_error_handler(413, handle_413)
-    app.register_error_handler(500, handle_500)
-    app.register_error_handler(PermissionError, handle_permission_error)
-    app.register_error_handler(InvalidInput, handle_invalid_input)
-    app.register_error_handler(ConflictError, handle_conflict)
+    handlers = (
+        (404, handle_404),
+        (403, handle_403),
+        (413, handle_413),
+        (500, handle_500),
+        (PermissionError, handle_permission_error),
+        (InvalidInput, handle_invalid_input),
+        (ConflictError, handle_conflict),
+    )
+    for code_or_exception, handler in handlers:
+        app.register_error_handler(code_or_exception, handler)
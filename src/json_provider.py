@@ -0,0 +1,60 @@
+"""orjson-backed JSON for Flask responses and socket.io packets, used when orjson is available."""
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: Flask's stdlib-json provider is used instead
+    orjson = None
+
+
+if orjson is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """DefaultJSONProvider that encodes and decodes with orjson.
+
+        Datetimes and dataclasses are passed through to DefaultJSONProvider.default
+        so they serialize exactly as before; keys stay sorted. The only visible
+        difference is non-ASCII text sent as UTF-8 instead of \\u escapes.
+        """
+
+        OPTIONS = (
+            orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+            | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_SORT_KEYS
+        )
+
+        def dumps(self, obj, **kwargs):
+            if kwargs:  # indent etc. are stdlib-json options
+                return super().dumps(obj, **kwargs)
+            return orjson.dumps(obj, default=self.default, option=self.OPTIONS).decode()
+
+        def loads(self, s, **kwargs):
+            if kwargs:
+                return super().loads(s, **kwargs)
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                return super().response(*args, **kwargs)  # pretty-printed
+            obj = self._prepare_response_obj(args, kwargs)
+            body = orjson.dumps(obj, default=self.default, option=self.OPTIONS | orjson.OPT_APPEND_NEWLINE)
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+    class OrjsonPacketJSON:
+        """json-module stand-in for python-socketio/engineio packet encoding.
+
+        They call dumps(obj, separators=(',', ':')), which is orjson's
+        compact output already, so stdlib keyword arguments are ignored.
+        """
+
+        @staticmethod
+        def dumps(obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        @staticmethod
+        def loads(s, **kwargs):
+            return orjson.loads(s)
+else:
+    OrjsonProvider = None
+    OrjsonPacketJSON = None  # SocketIO(json=None) keeps the stdlib json module
@@ -5,18 +5,34 @@ Initializes the database, runs migrations, creates the initial admin account,
 and registers all route blueprints and WebSocket event handlers.
 """
 
+import contextlib
+import hashlib
+import logging
 import os
 import sys
 import secrets
+import sqlite3
 import string
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every process initializes
+    fcntl = None
+
 # Path setup for proper module imports
 # DON'T CHANGE THIS - Required for Docker and various deployment scenarios
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-
-from flask import Flask, send_from_directory
+# Only needed when run as a script (python src/main.py); when imported as
+# src.main (gunicorn, flask CLI) the project root is already importable.
+if not __package__:
+    _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if _project_root not in sys.path:
+        sys.path.insert(0, _project_root)
+
+from flask import Flask, Response, request, send_file
 from flask_cors import CORS
 from flask_login import LoginManager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 # Import models in the correct order to avoid circular imports
 from src.models.user import db, User
@@ -27,20 +43,31 @@ from src.models.label import Label, NoteLabel
 
 from src.limiter import limiter
 from src.routes.user import user_bp
-from src.routes.note import note_bp
+from src.routes.note import note_bp, note_debug_bp
 from src.routes.auth import auth_bp
 from src.routes.label import label_bp
 from src.routes.attachment import attachment_bp
 from src.websocket_events import socketio
 from src.error_handlers import register_error_handlers
+from src.json_provider import OrjsonProvider
+
+# Named explicitly so it stays under the 'src' handler when run as a script.
+logger = logging.getLogger('src.main')
 
-def log_with_flush(message):
-    """Print a message and flush stdout immediately (required for Docker log visibility)."""
-    print(message)
-    sys.stdout.flush()
+# Application log output goes to stdout for Docker. StreamHandler flushes once
+# per record (and the image sets PYTHONUNBUFFERED), so no manual flushes needed.
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter('%(message)s'))
+_app_logger = logging.getLogger('src')
+_app_logger.addHandler(_log_handler)
+_app_logger.setLevel(logging.INFO)
+_app_logger.propagate = False
 
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+# Note lists are the largest responses; encode them with orjson when installed.
+if OrjsonProvider is not None:
+    app.json = OrjsonProvider(app)
 
 _secret_key = os.environ.get('SECRET_KEY')
 _is_production = os.environ.get('FLASK_ENV') == 'production'
@@ -50,23 +77,31 @@ if not _secret_key:
     _secret_key = 'dev_secret_key_not_for_production'
 app.config['SECRET_KEY'] = _secret_key
 
-# Restrict CORS to the configured origin; fall back to same-origin only.
+# Restrict CORS to the configured origin; fall back to same-origin only. With no
+# origin configured flask-cors could never emit a header, so it isn't installed
+# at all and requests skip its per-request origin matching.
 _allowed_origin = os.environ.get('ALLOWED_ORIGIN', '')
-CORS(app, supports_credentials=True, origins=[_allowed_origin] if _allowed_origin else [])
+if _allowed_origin:
+    CORS(app, supports_credentials=True, origins=[_allowed_origin])
 
 limiter.init_app(app)
 
 
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'SAMEORIGIN',
+    'X-XSS-Protection': '1; mode=block',
+}
+
+
 @app.after_request
 def after_request(response):
-    """Add security and PWA headers to every response."""
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-
-    if 'Service-Worker-Allowed' not in response.headers:
-        response.headers['Service-Worker-Allowed'] = '/'
+    """Add security headers to every response.
 
+    Service-Worker-Allowed is only meaningful on the service worker scripts
+    themselves, so serve() adds it there rather than on every response.
+    """
+    response.headers.update(SECURITY_HEADERS)
     return response
 
 
@@ -80,15 +115,15 @@ login_manager.login_message_category = 'info'
 @login_manager.user_loader
 def load_user(user_id):
     """Load a user object from the session by ID."""
-    return User.query.get(int(user_id))
+    return User.get_cached(int(user_id))
 
 
 try:
     socketio.init_app(app, cors_allowed_origins=[_allowed_origin] if _allowed_origin else [])
-    log_with_flush("✅ SocketIO initialized successfully")
+    logger.info("✅ SocketIO initialized successfully")
 except Exception as e:
-    log_with_flush(f"⚠️ SocketIO initialization failed: {e}")
-    log_with_flush("App will continue without real-time features")
+    logger.warning("⚠️ SocketIO initialization failed: %s", e)
+    logger.warning("App will continue without real-time features")
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(user_bp, url_prefix='/api')
@@ -96,43 +131,73 @@ app.register_blueprint(note_bp, url_prefix='/api')
 app.register_blueprint(label_bp, url_prefix='/api')
 app.register_blueprint(attachment_bp, url_prefix='/api')
 
+# Only route the diagnostics endpoints (/debug/pwa, /api/debug/*) outside
+# production, or when explicitly asked for, so production deployments don't
+# ship them by default.
+_debug_routes_enabled = not _is_production or os.environ.get('ENABLE_DEBUG_ROUTES', '').strip().lower() in ('1', 'true', 'yes', 'on')
+if _debug_routes_enabled:
+    app.register_blueprint(note_debug_bp, url_prefix='/api')
+
 # Cap request bodies. Slightly above the 25 MB per-file attachment limit to
 # leave room for multipart overhead; save_upload enforces the exact file cap.
 app.config['MAX_CONTENT_LENGTH'] = 26 * 1024 * 1024
 
 register_error_handlers(app)
 
-@app.route('/debug/pwa')
-def debug_pwa():
-    """Return debug information about PWA file availability (admin only)."""
-    from flask_login import current_user
-    if not current_user.is_authenticated or not current_user.is_admin:
-        from flask import abort
-        abort(403)
+PWA_FILES = ('manifest.webmanifest', 'sw.js', 'pwa-192x192.png', 'pwa-512x512.png')
+
+
+def build_pwa_debug_info(static_folder):
+    """Collect PWA file availability and the parsed manifest for /debug/pwa."""
     import json
     debug_info = {
-        'static_folder': app.static_folder,
+        'static_folder': static_folder,
         'files_exist': {},
         'manifest_content': None
     }
-    
-    pwa_files = ['manifest.webmanifest', 'sw.js', 'pwa-192x192.png', 'pwa-512x512.png']
-    
-    for file in pwa_files:
-        file_path = os.path.join(app.static_folder, file)
+
+    for file in PWA_FILES:
+        file_path = os.path.join(static_folder, file)
         debug_info['files_exist'][file] = os.path.exists(file_path)
-        if file == 'manifest.webmanifest' and os.path.exists(file_path):
+        if file == 'manifest.webmanifest' and debug_info['files_exist'][file]:
             try:
                 with open(file_path, 'r') as f:
                     debug_info['manifest_content'] = json.load(f)
             except Exception as e:
                 debug_info['manifest_content'] = f"Error reading manifest: {str(e)}"
-    
+
     return debug_info
 
 
+def debug_pwa():
+    """Return debug information about PWA file availability (admin only)."""
+    from flask_login import current_user
+    if not current_user.is_authenticated or not current_user.is_admin:
+        from flask import abort
+        abort(403)
+    # The static bundle only changes on redeploy (which restarts the app), so
+    # the scan runs on the first request and is reused afterwards.
+    if 'PWA_DEBUG_INFO' not in app.config:
+        app.config['PWA_DEBUG_INFO'] = build_pwa_debug_info(app.static_folder)
+    return app.config['PWA_DEBUG_INFO']
+
+
+if _debug_routes_enabled:
+    app.add_url_rule('/debug/pwa', view_func=debug_pwa)
+
+
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLAlchemy already pools file-backed SQLite with a QueuePool; size it for the
+# eventlet worker's concurrent greenlets, and let a connection wait up to 30s on
+# the database lock (WAL still serializes writers) instead of failing fast.
+# Pre-ping/recycle are left off: a local SQLite file has no server to drop idle
+# connections.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'connect_args': {'timeout': 30},
+}
 
 # The session cookie's Secure flag is NOT tied to FLASK_ENV: this is a
 # self-hosted app commonly served over plain HTTP on a LAN, where a Secure
@@ -147,6 +212,30 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
 
 db.init_app(app)
 
+# Per-connection tuning for the app's own SQLite connections. journal_mode=WAL
+# is persistent (the migrations set it too) and lets readers run alongside a
+# writer; the rest are per-connection settings and must be reapplied each time.
+SQLITE_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLITE_CONNECTION_PRAGMAS to every new SQLite connection."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
 def generate_secure_password(length=10):
     """Generate a cryptographically secure random password with mixed character types.
 
@@ -157,6 +246,8 @@ def generate_secure_password(length=10):
         str: Secure random password containing at least one uppercase, lowercase, and digit.
     """
     alphabet = string.ascii_letters + string.digits
+    # Bytes at or above this bound are rejected so byte % len(alphabet) stays uniform.
+    limit = 256 - 256 % len(alphabet)
 
     password = [
         secrets.choice(string.ascii_uppercase),
@@ -164,8 +255,10 @@ def generate_secure_password(length=10):
         secrets.choice(string.digits)
     ]
 
-    for _ in range(length - 3):
-        password.append(secrets.choice(alphabet))
+    # Draw random bytes in bulk rather than one secrets.choice() call per character.
+    while len(password) < length:
+        password.extend(alphabet[b % len(alphabet)] for b in secrets.token_bytes(length * 2) if b < limit)
+    del password[max(length, 3):]
 
     secrets.SystemRandom().shuffle(password)
 
@@ -178,9 +271,8 @@ def create_initial_admin():
         User: The newly created admin user, or None if users already exist.
     """
     try:
-        user_count = User.query.count()
-
-        if user_count == 0:
+        # Existence probe: stops at the first row instead of counting them all.
+        if db.session.query(User.id).first() is None:
             admin_password = generate_secure_password(10)
 
             admin = User(
@@ -192,31 +284,34 @@ def create_initial_admin():
             db.session.add(admin)
             db.session.commit()
 
-            log_with_flush("=" * 80)
-            log_with_flush("🔐 FridgeNotes - INITIAL ADMIN ACCOUNT CREATED")
-            log_with_flush("=" * 80)
-            log_with_flush(f"📧 Username: admin")
-            log_with_flush(f"🔑 Password: {admin_password}")
-            log_with_flush("=" * 80)
-            log_with_flush("⚠️  IMPORTANT: Save this password! It will not be shown again.")
-            log_with_flush("🛡️  You can change this password after logging in.")
-            log_with_flush("👥 Create additional users through the admin panel.")
-            log_with_flush("=" * 80)
+            rule = "=" * 80
+            logger.info("\n".join([
+                rule,
+                "🔐 FridgeNotes - INITIAL ADMIN ACCOUNT CREATED",
+                rule,
+                "📧 Username: admin",
+                f"🔑 Password: {admin_password}",
+                rule,
+                "⚠️  IMPORTANT: Save this password! It will not be shown again.",
+                "🛡️  You can change this password after logging in.",
+                "👥 Create additional users through the admin panel.",
+                rule,
+            ]))
 
             return admin
 
     except Exception as e:
-        log_with_flush(f"❌ Error during admin creation: {e}")
+        logger.error("❌ Error during admin creation: %s", e)
         db.session.rollback()
         return None
 
-    log_with_flush("👥 User accounts already exist - skipping admin creation")
+    logger.info("👥 User accounts already exist - skipping admin creation")
     return None
 
 
 def run_post_init_migrations():
     """Run schema migrations that depend on tables and data already being in place."""
-    log_with_flush("🔄 Running post-initialization migrations...")
+    logger.info("🔄 Running post-initialization migrations...")
 
     try:
         from src.migrations import (
@@ -237,38 +332,152 @@ def run_post_init_migrations():
             migration_success = False
 
         if migration_success:
-            log_with_flush("✅ Post-initialization migrations completed successfully!")
+            logger.info("✅ Post-initialization migrations completed successfully!")
         else:
-            log_with_flush("⚠️ Post-initialization migration had issues, but app will continue")
+            logger.warning("⚠️ Post-initialization migration had issues, but app will continue")
 
     except Exception as migration_error:
-        log_with_flush(f"⚠️ Post-initialization migration warning: {migration_error}")
-        log_with_flush("App will continue with fallback compatibility mode")
+        logger.warning("⚠️ Post-initialization migration warning: %s", migration_error)
+        logger.warning("App will continue with fallback compatibility mode")
 
 
-with app.app_context():
-    try:
-        log_with_flush("🚀 Initializing FridgeNotes during app creation...")
+@contextlib.contextmanager
+def init_lock(lock_path):
+    """Serialize startup initialization across processes sharing the database.
+
+    Yields True in the process that took the lock first and should run
+    migrations; any process that had to wait yields False, since by the time it
+    gets the lock that work has already been done.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(lock_path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+        except BlockingIOError:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            acquired = False
+        try:
+            yield acquired
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def schema_fingerprint():
+    """Identify the schema this code expects: its models plus the newest migration."""
+    from src.migrations import MIGRATIONS
+    return f"{MIGRATIONS[-1].migration_name}|{','.join(sorted(db.metadata.tables))}"
 
-        log_with_flush("Creating database tables...")
-        db.create_all()
 
-        log_with_flush("Running database migrations...")
+def read_schema_stamp(db_path):
+    """Return the (fingerprint, schema_version) recorded after the last full init, if any.
+
+    Read with plain sqlite3 so a current database can be checked before any
+    SQLAlchemy or migration work happens.
+    """
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(db_path)
         try:
-            from src.migrations import run_all_migrations
-            run_all_migrations()
-        except Exception as migration_error:
-            log_with_flush(f"⚠️ Migration warning: {migration_error}")
-            log_with_flush("App will continue with fallback compatibility mode")
+            row = conn.execute(
+                "SELECT value FROM _app_meta WHERE key = 'schema_fingerprint'"
+            ).fetchone()
+            recorded_version = conn.execute(
+                "SELECT value FROM _app_meta WHERE key = 'schema_version'"
+            ).fetchone()
+            current_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if row is None or recorded_version is None or int(recorded_version[0]) != current_version:
+        return None
+    return row[0], current_version
 
-        log_with_flush("Checking for admin user...")
-        create_initial_admin()
 
-        run_post_init_migrations()
+def write_schema_stamp(db_path, fingerprint):
+    """Record the fingerprint and PRAGMA schema_version of a fully initialized database."""
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            # Create first: CREATE TABLE bumps schema_version, the INSERTs don't.
+            conn.execute("CREATE TABLE IF NOT EXISTS _app_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO _app_meta (key, value) VALUES (?, ?)",
+                [('schema_fingerprint', fingerprint), ('schema_version', str(version))],
+            )
+    finally:
+        conn.close()
 
-        log_with_flush("✅ Initialization complete!")
-    except Exception as e:
-        log_with_flush(f"❌ Initialization error: {e}")
+
+_database_dir = os.path.join(os.path.dirname(__file__), 'database')
+_database_path = os.path.join(_database_dir, 'app.db')
+os.makedirs(_database_dir, exist_ok=True)
+
+def bootstrap(app):
+    """Create tables, run migrations and create the initial admin, once per process."""
+    if app.extensions.get('fridgenotes_bootstrapped'):
+        return
+    app.extensions['fridgenotes_bootstrapped'] = True
+
+    with app.app_context(), init_lock(os.path.join(_database_dir, '.init.lock')) as run_init:
+        try:
+            logger.info("🚀 Initializing FridgeNotes during app creation...")
+
+            fingerprint = schema_fingerprint()
+            stamp = read_schema_stamp(_database_path)
+            if stamp is not None and stamp[0] == fingerprint:
+                # Nothing has touched the schema since the last full init: tables,
+                # migrations and the admin account are all already in place.
+                logger.info("✅ Database schema is current - skipping migrations")
+            else:
+                logger.info("Creating database tables...")
+                db.create_all()
+
+                if run_init:
+                    logger.info("Running database migrations...")
+                    migrations_ok = False
+                    try:
+                        from src.migrations import run_all_migrations
+                        migrations_ok = run_all_migrations()
+                    except Exception as migration_error:
+                        logger.warning("⚠️ Migration warning: %s", migration_error)
+                        logger.warning("App will continue with fallback compatibility mode")
+
+                    logger.info("Checking for admin user...")
+                    create_initial_admin()
+
+                    if migrations_ok:
+                        # 001-003 were just applied as part of the full run, so
+                        # the post-init pass would only reopen the database three
+                        # times to find them already recorded.
+                        write_schema_stamp(_database_path, fingerprint)
+                    else:
+                        run_post_init_migrations()
+                else:
+                    logger.info("Another worker initialized the database - skipping migrations")
+
+            logger.info("✅ Initialization complete!")
+        except Exception as e:
+            logger.error("❌ Initialization error: %s", e)
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Initialize the database: tables, migrations and the initial admin account."""
+    bootstrap(app)
+
+
+# The Docker entrypoint runs `flask init-db` once before starting gunicorn and
+# sets FRIDGENOTES_SKIP_INIT so serving workers don't repeat it on import.
+# Everywhere else (python src/main.py, a bare gunicorn) initialization still
+# happens on import, so the app never serves against an uninitialized database.
+if os.environ.get('FRIDGENOTES_SKIP_INIT', '').strip().lower() not in ('1', 'true', 'yes', 'on'):
+    bootstrap(app)
 
 
 @app.route('/api/health')
@@ -277,42 +486,125 @@ def health_check():
     return {'status': 'ok'}
 
 
+# Extra headers for PWA assets, looked up by file name first, then extension.
+_SERVICE_WORKER_HEADERS = {
+    'Content-Type': 'application/javascript',
+    'Cache-Control': 'no-cache',
+    'Service-Worker-Allowed': '/',
+}
+STATIC_HEADERS_BY_NAME = {
+    'sw.js': _SERVICE_WORKER_HEADERS,
+    'registerSW.js': _SERVICE_WORKER_HEADERS,
+}
+STATIC_HEADERS_BY_EXT = {
+    '.webmanifest': {
+        'Content-Type': 'application/manifest+json',
+        'Cache-Control': 'no-cache',
+    },
+}
+PWA_ICON_HEADERS = {'Cache-Control': 'public, max-age=31536000'}  # 1 year
+# Vite writes content-hashed bundles under assets/; a changed file gets a new
+# name, so browsers can keep these forever without revalidating.
+HASHED_ASSET_HEADERS = {'Cache-Control': 'public, max-age=31536000, immutable'}
+
+
+def static_asset_headers(path):
+    """Return the extra response headers for a static asset path, if any."""
+    if path.startswith('assets/'):
+        return HASHED_ASSET_HEADERS
+    headers = STATIC_HEADERS_BY_NAME.get(os.path.basename(path))
+    if headers is not None:
+        return headers
+    ext = os.path.splitext(path)[1]
+    if ext == '.png' and path.startswith('pwa-'):
+        return PWA_ICON_HEADERS
+    return STATIC_HEADERS_BY_EXT.get(ext)
+
+
+def build_static_index(static_folder):
+    """Map the URL path of every static file to its absolute path and extra headers."""
+    index = {}
+    if static_folder and os.path.isdir(static_folder):
+        for root, _dirs, files in os.walk(static_folder):
+            for name in files:
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, static_folder).replace(os.sep, '/')
+                index[path] = (full_path, static_asset_headers(path))
+    return index
+
+
+# The built frontend only changes on redeploy, so it is indexed once at startup
+# and serve() dispatches on a dict lookup instead of stat()ing every request or
+# re-classifying the path for its cache headers.
+# Only indexed files can be served, which also rules out path traversal.
+STATIC_INDEX = build_static_index(app.static_folder)
+
+
+def load_index_html(static_folder):
+    """Read the SPA shell (index.html) and its ETag, or None if it is missing."""
+    if not static_folder:
+        return None
+    index_path = os.path.join(static_folder, 'index.html')
+    if not os.path.isfile(index_path):
+        return None
+    with open(index_path, 'rb') as f:
+        body = f.read()
+    return body, hashlib.md5(body, usedforsecurity=False).hexdigest()
+
+
+# Every client-side route falls back to index.html, so it is held in memory
+# rather than re-opened per navigation.
+INDEX_HTML = load_index_html(app.static_folder)
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
     """Serve the React SPA, adding appropriate headers for PWA assets."""
+    global STATIC_INDEX
     static_folder_path = app.static_folder
     if static_folder_path is None:
         return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        response = send_from_directory(static_folder_path, path)
+    entry = STATIC_INDEX.get(path)
+    if entry is None and path and app.debug:
+        # Development: pick up files written by a frontend rebuild.
+        STATIC_INDEX = build_static_index(static_folder_path)
+        entry = STATIC_INDEX.get(path)
+
+    if entry is not None:
+        file_path, headers = entry
+        # conditional=True answers If-None-Match/If-Modified-Since with a 304 and
+        # no body, so revalidated assets are never re-read or re-sent.
+        response = send_file(file_path, conditional=True)
 
-        if path.endswith('.webmanifest'):
-            response.headers['Content-Type'] = 'application/manifest+json'
-            response.headers['Cache-Control'] = 'no-cache'
-        elif path.endswith('sw.js') or path.endswith('registerSW.js'):
-            response.headers['Content-Type'] = 'application/javascript'
-            response.headers['Cache-Control'] = 'no-cache'
-            response.headers['Service-Worker-Allowed'] = '/'
-        elif path.startswith('pwa-') and path.endswith('.png'):
-            response.headers['Cache-Control'] = 'public, max-age=31536000'  # 1 year
+        if headers:
+            response.headers.update(headers)
 
         return response
     else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+        index_html = load_index_html(static_folder_path) if app.debug else INDEX_HTML
+        if index_html is None:
             return "index.html not found", 404
+        body, etag = index_html
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        # Revalidate on every load so a redeploy's new bundle names are picked up.
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+
+# Every route is registered by now. Werkzeug defers sorting the rules until the
+# first match, so compile the matcher here rather than on the first request.
+app.url_map.update()
 
 
 if __name__ == '__main__':
     is_production = os.environ.get('FLASK_ENV') == 'production'
 
     if is_production:
-        log_with_flush("🐳 Starting in production mode...")
+        logger.info("🐳 Starting in production mode...")
         socketio.run(app, host='0.0.0.0', port=5009, debug=False, allow_unsafe_werkzeug=True)
     else:
-        log_with_flush("🔧 Starting in development mode...")
+        logger.info("🔧 Starting in development mode...")
         app.run(host='0.0.0.0', port=5009, debug=True)
\ No newline at end of file
@@ -3,22 +3,38 @@ Automatic database migration system
 Runs migrations automatically when the app starts
 """
 
+import functools
+import logging
 import sqlite3
 import os
+import sys
 from flask import current_app
 
+logger = logging.getLogger(__name__)
+
 def get_db_path():
     """Get the database path from the app configuration or use default"""
+    db_uri = ''
     try:
         # Try to get from Flask config if available
         if current_app:
             db_uri = current_app.config.get('SQLALCHEMY_DATABASE_URI', '')
-            if 'sqlite:///' in db_uri:
-                config_path = db_uri.replace('sqlite:///', '')
-                print(f"Flask config database path: {config_path}")
-                return config_path
-    except:
+    except RuntimeError:
+        # Outside an application context (e.g. run standalone)
         pass
+    return resolve_db_path(db_uri)
+
+@functools.lru_cache(maxsize=4)
+def resolve_db_path(db_uri=''):
+    """Resolve the database path for a configured URI, probing the filesystem once.
+
+    Every migration asks for the path; memoizing per URI means the Docker/local
+    candidate paths are only stat()ed on the first call.
+    """
+    if 'sqlite:///' in db_uri:
+        config_path = db_uri.replace('sqlite:///', '')
+        logger.debug('Flask config database path: %s', config_path)
+        return config_path
     
     # Check if we're in Docker (look for Docker-specific paths first)
     docker_paths = [
@@ -29,7 +45,7 @@ def get_db_path():
     # Check if we're in Docker environment
     for path in docker_paths:
         if os.path.exists(path):
-            print(f"Found database in Docker at: {path}")
+            logger.debug('Found database in Docker at: %s', path)
             return path
     
     # Local development paths
@@ -42,21 +58,66 @@ def get_db_path():
     
     for path in local_paths:
         if os.path.exists(path):
-            print(f"Found database locally at: {path}")
+            logger.debug('Found database locally at: %s', path)
             return path
     
     # If no database exists, determine where it should be created
     if os.path.exists('/app'):
         # We're in Docker
         default_path = '/app/src/database/app.db'
-        print(f"Docker environment detected, using: {default_path}")
+        logger.debug('Docker environment detected, using: %s', default_path)
         return default_path
     else:
         # Local development
         default_path = 'data/app.db'
-        print(f"Local environment detected, using: {default_path}")
+        logger.debug('Local environment detected, using: %s', default_path)
         return default_path
 
+# Write-oriented tuning applied to every migration connection. WAL + synchronous=NORMAL
+# avoids an fsync per statement during bulk ALTER/UPDATE work; journal_mode=WAL is
+# persistent, so the app's own connections benefit too.
+MIGRATION_PRAGMAS = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA cache_size=-65536;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+'''
+
+
+# Prepared-statement cache per migration connection (sqlite3 defaults to 128).
+# The bookkeeping statements (history lookups/inserts, column introspection) are
+# constant text, so a roomier cache keeps them compiled across migrations.
+MIGRATION_STATEMENT_CACHE_SIZE = 256
+
+
+def connect_db(db_path):
+    """Open a migration connection with write-optimizing PRAGMAs applied.
+
+    The connection is in autocommit mode (isolation_level=None) so each migration
+    controls its own transaction with an explicit BEGIN IMMEDIATE ... COMMIT,
+    batching all of its DDL and data writes into a single commit.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=MIGRATION_STATEMENT_CACHE_SIZE)
+    conn.executescript(MIGRATION_PRAGMAS)
+    return conn
+
+def backup_database(db_path, backup_path):
+    """Copy the database to backup_path with SQLite's online backup API.
+
+    Unlike a file copy, this yields a consistent snapshot even while other
+    connections are writing (including frames still in the WAL), and copies in
+    1000-page steps so the source lock is released between steps.
+    """
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(backup_path)
+    try:
+        with target:
+            source.backup(target, pages=1000, sleep=0.050)
+    finally:
+        target.close()
+        source.close()
+
 def check_table_exists(cursor, table_name):
     """Check if a table exists in the database"""
     cursor.execute("""
@@ -83,1183 +144,1088 @@ def is_migration_applied(cursor, migration_name):
     ''', (migration_name,))
     return cursor.fetchone()[0] > 0
 
+def load_applied_migrations(cursor):
+    """Return the names of every applied migration, read with a single query"""
+    cursor.execute("SELECT migration_name FROM migration_history")
+    return frozenset(name for (name,) in cursor.fetchall())
+
+MARK_MIGRATION_APPLIED_SQL = '''
+    INSERT OR IGNORE INTO migration_history (migration_name)
+    VALUES (?)
+'''
+
 def mark_migration_applied(cursor, migration_name):
     """Mark a migration as applied"""
-    cursor.execute('''
-        INSERT OR IGNORE INTO migration_history (migration_name) 
-        VALUES (?)
-    ''', (migration_name,))
+    mark_migrations_applied(cursor, [migration_name])
 
-def check_column_exists(cursor, table_name, column_name):
-    """Check if a column exists in a table"""
+def mark_migrations_applied(cursor, migration_names):
+    """Mark several migrations as applied with one prepared INSERT"""
+    cursor.executemany(MARK_MIGRATION_APPLIED_SQL, [(name,) for name in migration_names])
+
+# Column sets keyed by (database file, schema_version, table). SQLite bumps
+# schema_version on every DDL statement, so an entry can never outlive the
+# schema it describes, and re-runs on an unchanged database skip the table scan.
+_table_columns_cache = {}
+
+SCHEMA_KEY_SQL = '''
+    SELECT (SELECT file FROM pragma_database_list WHERE name = 'main'), schema_version
+    FROM pragma_schema_version
+'''
+
+
+def get_table_columns(cursor, table_name):
+    """Return the set of column names in a table (empty if it can't be read).
+
+    Migrations that check several columns introspect once and test membership,
+    adding to the set after each ALTER, instead of re-running PRAGMA table_info.
+    """
     try:
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [column[1] for column in cursor.fetchall()]
-        return column_name in columns
+        cursor.execute(SCHEMA_KEY_SQL)
+        key = (*cursor.fetchone(), table_name)
+        columns = _table_columns_cache.get(key)
+        if columns is None:
+            # The pragma_table_info() table-valued function takes a bound parameter, so
+            # the statement text is constant and reused from the statement cache.
+            cursor.execute("SELECT name FROM pragma_table_info(?)", (table_name,))
+            columns = _table_columns_cache[key] = frozenset(row[0] for row in cursor.fetchall())
+        return set(columns)
     except sqlite3.Error:
-        return False
+        return set()
+
+def check_column_exists(cursor, table_name, column_name):
+    """Check if a column exists in a table"""
+    return column_name in get_table_columns(cursor, table_name)
+
+# Initial drag & drop positions rank each user's notes newest-first (1-based).
+# Window functions (SQLite 3.25+) compute the rank in one sorted pass; UPDATE ... FROM
+# (SQLite 3.33+) then applies it as a single join instead of a per-row subquery.
+POSITION_BACKFILL_UPDATE_FROM_SQL = '''
+    WITH ranked AS (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY created_at DESC
+        ) AS rn
+        FROM notes
+    )
+    UPDATE notes SET position = ranked.rn
+    FROM ranked
+    WHERE notes.id = ranked.id
+'''
+
+POSITION_BACKFILL_WINDOW_SQL = '''
+    WITH ranked AS (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY created_at DESC
+        ) AS rn
+        FROM notes
+    )
+    UPDATE notes SET position = (SELECT rn FROM ranked WHERE ranked.id = notes.id)
+'''
+
+# Pre-3.25 fallback: correlated COUNT(*) rescans the user's notes for every row (O(N^2)).
+POSITION_BACKFILL_LEGACY_SQL = '''
+    UPDATE notes
+    SET position = (
+        SELECT COUNT(*)
+        FROM notes n2
+        WHERE n2.user_id = notes.user_id
+        AND n2.created_at >= notes.created_at
+    )
+'''
+
+
+# Transient index matching the window's PARTITION BY/ORDER BY, so the ranking is a
+# covering index scan instead of a temp B-tree sort. Dropped once positions are set.
+POSITION_BACKFILL_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_notes_user_created
+    ON notes(user_id, created_at DESC)
+'''
+
+
+# Built only after the backfill has written every row (see migration 004).
+POSITION_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_notes_user_position
+    ON notes(user_id, position)
+'''
+
+
+# Large tables are backfilled in id-range batches with a commit between each, so
+# the write lock is released periodically instead of held for the whole UPDATE.
+POSITION_BACKFILL_BATCH_THRESHOLD = 50000
+POSITION_BACKFILL_BATCH_SIZE = 10000
+
+# Recorded in migration_history while a batched backfill is in flight. Batches
+# commit the ALTER TABLE early, so an interrupted run leaves the column in place;
+# this marker tells the next run to redo the backfill instead of skipping it.
+POSITION_BACKFILL_PENDING = "004_add_position_field:backfill_pending"
+
+POSITION_STAGING_INSERT_SQL = '''
+    INSERT INTO position_staging (id, pos)
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC)
+    FROM notes
+'''
+
+POSITION_STAGING_UPDATE_SQL = '''
+    UPDATE notes
+    SET position = (SELECT pos FROM position_staging WHERE position_staging.id = notes.id)
+    WHERE id BETWEEN ? AND ?
+'''
+
+
+def _backfill_note_positions_batched(cursor):
+    """Stage per-user ranks in a temp table, then apply them in committed batches.
+
+    Expects an open BEGIN IMMEDIATE transaction and leaves a new one open after
+    the last batch, so the caller's remaining work still commits atomically.
+    """
+    conn = cursor.connection
+    cursor.execute("DROP TABLE IF EXISTS temp.position_staging")
+    cursor.execute("CREATE TEMP TABLE position_staging (id INTEGER PRIMARY KEY, pos INTEGER NOT NULL)")
+    cursor.execute(POSITION_STAGING_INSERT_SQL)
+    mark_migration_applied(cursor, POSITION_BACKFILL_PENDING)
+
+    cursor.execute("SELECT MIN(id), MAX(id) FROM position_staging")
+    low, high = cursor.fetchone()
+    updated = 0
+    for start in range(low, high + 1, POSITION_BACKFILL_BATCH_SIZE):
+        cursor.execute(POSITION_STAGING_UPDATE_SQL, (start, start + POSITION_BACKFILL_BATCH_SIZE - 1))
+        updated += cursor.rowcount
+        conn.commit()
+        cursor.execute("BEGIN IMMEDIATE")
+
+    cursor.execute("DROP TABLE position_staging")
+    cursor.execute("DELETE FROM migration_history WHERE migration_name = ?", (POSITION_BACKFILL_PENDING,))
+    return updated
+
+
+def backfill_note_positions(cursor):
+    """Assign initial per-user note positions using the fastest form SQLite supports.
+
+    Returns the number of notes positioned, so callers can report it without
+    scanning the table again.
+    """
+    # Fresh installs have no notes yet: skip the index build and UPDATE entirely.
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM notes)")
+    if not cursor.fetchone()[0]:
+        return 0
+
+    cursor.execute(POSITION_BACKFILL_INDEX_SQL)
+    # Bounded probe: stops reading once past the threshold instead of counting every row.
+    cursor.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM notes LIMIT ?)",
+        (POSITION_BACKFILL_BATCH_THRESHOLD + 1,),
+    )
+    is_large = cursor.fetchone()[0] > POSITION_BACKFILL_BATCH_THRESHOLD
+    if is_large and sqlite3.sqlite_version_info >= (3, 25, 0):
+        updated = _backfill_note_positions_batched(cursor)
+    else:
+        # cursor.rowcount is -1 for statements starting with WITH, so measure the
+        # rows written via the connection's change counter instead.
+        changes_before = cursor.connection.total_changes
+        if sqlite3.sqlite_version_info >= (3, 33, 0):
+            cursor.execute(POSITION_BACKFILL_UPDATE_FROM_SQL)
+        elif sqlite3.sqlite_version_info >= (3, 25, 0):
+            cursor.execute(POSITION_BACKFILL_WINDOW_SQL)
+        else:
+            cursor.execute(POSITION_BACKFILL_LEGACY_SQL)
+        updated = cursor.connection.total_changes - changes_before
+    cursor.execute("DROP INDEX IF EXISTS idx_notes_user_created")
+    return updated
+
+
+def _run_migration(migration_name, apply, foreign_keys_off=False, conn=None):
+    """Run one migration in its own BEGIN IMMEDIATE transaction.
+
+    Handles everything the migrations have in common: locating the database,
+    the migration_history bookkeeping, and commit/rollback. ``apply(cursor)``
+    performs the schema change and returns True to record the migration as
+    applied, or False to leave it pending (e.g. its table doesn't exist yet).
+    When ``conn`` is given (run_all_migrations) it is used and left open.
+    """
+    owns_conn = conn is None
+    if owns_conn:
+        db_path = get_db_path()
+
+        # Ensure the database directory exists
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            try:
+                os.makedirs(db_dir, exist_ok=True)
+                logger.info('Created database directory: %s', db_dir)
+            except Exception as e:
+                logger.warning('Could not create database directory %s: %s', db_dir, e)
+
+        if not os.path.exists(db_path):
+            logger.info('Database not found at %s, will be created when app starts', db_path)
+            return True
 
-def run_migration_000_cleanup_duplicate_tables():
-    """Migration 000: Clean up duplicate table structure from earlier versions"""
-    migration_name = "000_cleanup_duplicate_tables"
-    db_path = get_db_path()
-    
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, skipping migration")
-        return True
-    
-    conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        if owns_conn:
+            conn = connect_db(db_path)
         cursor = conn.cursor()
-        
+
+        if foreign_keys_off:
+            # Must be set outside a transaction; SQLite ignores it inside one.
+            cursor.execute("PRAGMA foreign_keys=OFF")
+        cursor.execute("BEGIN IMMEDIATE")
+
         # Create migration tracking table
         create_migration_table(cursor)
-        
+
         # Check if this migration has already been applied
         if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
+            logger.debug('✅ Migration %s already applied', migration_name)
+            conn.rollback()
             return True
-        
-        # Check for duplicate tables and clean them up
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        all_tables = [row[0] for row in cursor.fetchall()]
-        
-        tables_to_drop = []
-        
-        # Look for old singular table names that have newer plural versions
-        for table in all_tables:
-            if table in ['user', 'note', 'checklist_item', 'shared_note'] and f"{table}s" in all_tables:
-                tables_to_drop.append(table)
-        
-        if tables_to_drop:
-            print(f"📝 Running Migration {migration_name}: Cleaning up duplicate tables...")
-            for table in tables_to_drop:
-                print(f"   - Dropping old table: {table}")
-                cursor.execute(f"DROP TABLE IF EXISTS {table}")
-            
-            # Mark migration as applied
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            print(f"✅ Migration {migration_name} completed successfully!")
-        else:
-            print(f"✅ No duplicate tables found, marking {migration_name} as applied")
+
+        if apply(cursor):
             mark_migration_applied(cursor, migration_name)
-            conn.commit()
-        
+        if owns_conn:
+            # Refresh planner statistics for any tables this migration left stale.
+            # A shared run does this once at the end instead.
+            cursor.execute("PRAGMA optimize")
+        conn.commit()
         return True
-        
+
     except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
+        logger.error('❌ Migration %s failed: %s', migration_name, e)
+        if conn:
+            conn.rollback()
         return False
     except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
+        logger.error('❌ Unexpected error in Migration %s: %s', migration_name, e)
+        if conn:
+            conn.rollback()
         return False
     finally:
-        if conn:
+        if conn and owns_conn:
             conn.close()
 
-def run_migration_001_add_hidden_by_recipient():
-    """Migration 001: Add hidden_by_recipient column to shared_notes table"""
-    migration_name = "001_add_hidden_by_recipient"
-    db_path = get_db_path()
+def migration(migration_name, foreign_keys_off=False):
+    """Decorator turning ``fn(cursor)`` into a standalone, idempotent migration.
+
+    The decorated name stays a callable returning True on success, so migrations
+    can be run individually or from run_all_migrations(), which passes in its
+    shared connection.
+    """
+    def decorator(apply):
+        @functools.wraps(apply)
+        def run(conn=None):
+            return _run_migration(migration_name, apply, foreign_keys_off, conn)
+        run.migration_name = migration_name
+        return run
+    return decorator
+
+@migration("000_cleanup_duplicate_tables")
+def run_migration_000_cleanup_duplicate_tables(cursor):
+    """Migration 000: Clean up duplicate table structure from earlier versions"""
+    # Check for duplicate tables and clean them up
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    all_tables = [row[0] for row in cursor.fetchall()]
     
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    tables_to_drop = []
     
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
+    # Look for old singular table names that have newer plural versions
+    for table in all_tables:
+        if table in ['user', 'note', 'checklist_item', 'shared_note'] and f"{table}s" in all_tables:
+            tables_to_drop.append(table)
     
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-        
-        # Check if shared_notes table exists
-        if not check_table_exists(cursor, 'shared_notes'):
-            print("shared_notes table doesn't exist yet, skipping migration")
-            return True
-        
-        # Check if the column already exists (double-check)
-        if check_column_exists(cursor, 'shared_notes', 'hidden_by_recipient'):
-            print("✅ hidden_by_recipient column already exists, marking as applied")
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            return True
-        
-        # Add the new column
-        print(f"📝 Running Migration {migration_name}: Adding hidden_by_recipient column...")
-        cursor.execute('''
-            ALTER TABLE shared_notes 
-            ADD COLUMN hidden_by_recipient BOOLEAN NOT NULL DEFAULT FALSE
-        ''')
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
+    if tables_to_drop:
+        logger.info('📝 Running Migration 000_cleanup_duplicate_tables: Cleaning up duplicate tables...')
+        for table in tables_to_drop:
+            logger.debug('   - Dropping old table: %s', table)
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        logger.info('✅ Migration 000_cleanup_duplicate_tables completed successfully!')
+    else:
+        logger.info('✅ No duplicate tables found, marking 000_cleanup_duplicate_tables as applied')
+    return True
+
+@migration("001_add_hidden_by_recipient")
+def run_migration_001_add_hidden_by_recipient(cursor):
+    """Migration 001: Add hidden_by_recipient column to shared_notes table"""
+    # Check if shared_notes table exists
+    if not check_table_exists(cursor, 'shared_notes'):
+        logger.debug("shared_notes table doesn't exist yet, skipping migration")
         return False
-    finally:
-        if conn:
-            conn.close()
+    
+    # Check if the column already exists (double-check)
+    if check_column_exists(cursor, 'shared_notes', 'hidden_by_recipient'):
+        logger.debug('✅ hidden_by_recipient column already exists, marking as applied')
+        return True
+    
+    # Add the new column. SQLite's ADD COLUMN with a constant default only edits
+    # the schema: existing rows are not rewritten (records shorter than the new
+    # column count read the default), so NOT NULL DEFAULT FALSE is O(1) here and
+    # needs no nullable-column-plus-backfill workaround.
+    logger.info('📝 Running Migration 001_add_hidden_by_recipient: Adding hidden_by_recipient column...')
+    cursor.execute('''
+        ALTER TABLE shared_notes 
+        ADD COLUMN hidden_by_recipient BOOLEAN NOT NULL DEFAULT FALSE
+    ''')
+    
+    logger.info('✅ Migration 001_add_hidden_by_recipient completed successfully!')
+    return True
 
-def run_migration_002_add_color_field():
+@migration("002_add_color_field")
+def run_migration_002_add_color_field(cursor):
     """Migration 002: Add color field to notes table"""
-    migration_name = "002_add_color_field"
-    db_path = get_db_path()
-    
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    # Check if notes table exists
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
+        return False
     
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
+    # Check if the color column already exists
+    if check_column_exists(cursor, 'notes', 'color'):
+        logger.debug('✅ color column already exists, marking as applied')
         return True
     
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-        
-        # Check if notes table exists
-        if not check_table_exists(cursor, 'notes'):
-            print("notes table doesn't exist yet, skipping migration")
-            return True
-        
-        # Check if the color column already exists
-        if check_column_exists(cursor, 'notes', 'color'):
-            print("✅ color column already exists, marking as applied")
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            return True
-        
-        # Add the new column
-        print(f"📝 Running Migration {migration_name}: Adding color column...")
-        cursor.execute('''
-            ALTER TABLE notes 
-            ADD COLUMN color VARCHAR(20) NOT NULL DEFAULT 'default'
-        ''')
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+    # Add the new column
+    logger.info('📝 Running Migration 002_add_color_field: Adding color column...')
+    cursor.execute('''
+        ALTER TABLE notes 
+        ADD COLUMN color VARCHAR(20) NOT NULL DEFAULT 'default'
+    ''')
+    
+    logger.info('✅ Migration 002_add_color_field completed successfully!')
+    return True
 
-def run_migration_003_create_labels_system():
+@migration("003_create_labels_system")
+def run_migration_003_create_labels_system(cursor):
     """Migration 003: Create labels and note_labels tables"""
-    migration_name = "003_create_labels_system"
-    db_path = get_db_path()
+    logger.info('📝 Running Migration 003_create_labels_system: Creating labels system...')
     
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    # Create labels table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS labels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            color VARCHAR(20) NOT NULL DEFAULT '#3b82f6',
+            parent_id INTEGER NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_id) REFERENCES labels (id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
     
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
+    # Create note_labels junction table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_labels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            label_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
+            FOREIGN KEY (label_id) REFERENCES labels (id) ON DELETE CASCADE,
+            UNIQUE(note_id, label_id)
+        )
+    ''')
     
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-        
-        print(f"📝 Running Migration {migration_name}: Creating labels system...")
-        
-        # Create labels table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS labels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name VARCHAR(100) NOT NULL,
-                color VARCHAR(20) NOT NULL DEFAULT '#3b82f6',
-                parent_id INTEGER NULL,
-                user_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (parent_id) REFERENCES labels (id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Create note_labels junction table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS note_labels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                note_id INTEGER NOT NULL,
-                label_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
-                FOREIGN KEY (label_id) REFERENCES labels (id) ON DELETE CASCADE,
-                UNIQUE(note_id, label_id)
-            )
-        ''')
-        
-        # Create indexes for better performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_user_id ON labels (user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_parent_id ON labels (parent_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_note_labels_note_id ON note_labels (note_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_note_labels_label_id ON note_labels (label_id)')
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - Created labels table with hierarchical support")
-        print("   - Created note_labels junction table")
-        print("   - Added performance indexes")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def run_migration_004_add_position_field():
-    """Migration 004: Add position field to notes table for drag & drop reordering"""
-    migration_name = "004_add_position_field"
-    db_path = get_db_path()
+    # Create indexes for better performance
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_user_id ON labels (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_parent_id ON labels (parent_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_note_labels_note_id ON note_labels (note_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_note_labels_label_id ON note_labels (label_id)')
     
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    logger.info('✅ Migration 003_create_labels_system completed successfully!')
+    logger.debug('   - Created labels table with hierarchical support')
+    logger.debug('   - Created note_labels junction table')
+    logger.debug('   - Added performance indexes')
+    return True
+
+@migration("004_add_position_field")
+def run_migration_004_add_position_field(cursor):
+    """Migration 004: Add position field to notes table for drag & drop reordering"""
+    # Check if notes table exists
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
+        return False
     
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
+    # Check if the position column already exists
+    if check_column_exists(cursor, 'notes', 'position'):
+        if is_migration_applied(cursor, POSITION_BACKFILL_PENDING):
+            logger.debug('   - Resuming interrupted position backfill...')
+            backfill_note_positions(cursor)
+            cursor.execute(POSITION_INDEX_SQL)
+        logger.debug('✅ position column already exists, marking as applied')
         return True
     
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-        
-        # Check if notes table exists
-        if not check_table_exists(cursor, 'notes'):
-            print("notes table doesn't exist yet, skipping migration")
-            return True
-        
-        # Check if the position column already exists
-        if check_column_exists(cursor, 'notes', 'position'):
-            print("✅ position column already exists, marking as applied")
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            return True
-        
-        print(f"📝 Running Migration {migration_name}: Adding position column for drag & drop...")
-        
-        # Add the position column
-        cursor.execute('''
-            ALTER TABLE notes 
-            ADD COLUMN position INTEGER NOT NULL DEFAULT 0
-        ''')
-        
-        # Set initial positions based on created_at (newest first, maintaining current order)
-        print("   - Setting initial position values based on creation date...")
-        cursor.execute('''
-            UPDATE notes 
-            SET position = (
-                SELECT COUNT(*) 
-                FROM notes n2 
-                WHERE n2.user_id = notes.user_id 
-                AND n2.created_at >= notes.created_at
-            )
-        ''')
-        
-        # Create index for better performance
-        print("   - Creating performance index...")
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notes_user_position 
-            ON notes(user_id, position)
-        ''')
-        
-        # Get count of updated notes for confirmation
-        cursor.execute("SELECT COUNT(*) FROM notes WHERE position IS NOT NULL")
-        updated_count = cursor.fetchone()[0]
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print(f"   - Added position column to notes table")
-        print(f"   - Set positions for {updated_count} existing notes")
-        print(f"   - Created performance index")
-        print(f"   - Drag & drop reordering is now ready!")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def run_migration_005_add_pinned_field():
-    """Migration 005: Add pinned field to notes table for pinning important notes"""
-    migration_name = "005_add_pinned_field"
-    db_path = get_db_path()
+    logger.info('📝 Running Migration 004_add_position_field: Adding position column for drag & drop...')
     
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    # Add the position column
+    cursor.execute('''
+        ALTER TABLE notes 
+        ADD COLUMN position INTEGER NOT NULL DEFAULT 0
+    ''')
+    
+    # Set initial positions based on created_at (newest first, maintaining current order)
+    logger.debug('   - Setting initial position values based on creation date...')
+    updated_count = backfill_note_positions(cursor)
+    
+    # Create index for better performance. Populate first, index second: building
+    # the index once over final values is cheaper and yields a more compact tree
+    # than maintaining it through every row the backfill rewrites.
+    logger.debug('   - Creating performance index...')
+    cursor.execute(POSITION_INDEX_SQL)
+    if updated_count:
+        # Every row's position just changed; give the planner fresh stats for it.
+        cursor.execute("ANALYZE notes")
+    
+    logger.info('✅ Migration 004_add_position_field completed successfully!')
+    logger.debug('   - Added position column to notes table')
+    logger.debug('   - Set positions for %s existing notes', updated_count)
+    logger.debug('   - Created performance index')
+    logger.debug('   - Drag & drop reordering is now ready!')
+    return True
+
+@migration("005_add_pinned_field")
+def run_migration_005_add_pinned_field(cursor):
+    """Migration 005: Add pinned field to notes table for pinning important notes"""
+    # Check if notes table exists
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
+        return False
     
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
+    # Check if the pinned column already exists
+    if check_column_exists(cursor, 'notes', 'pinned'):
+        logger.debug('✅ pinned column already exists, marking as applied')
         return True
     
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-        
-        # Check if notes table exists
-        if not check_table_exists(cursor, 'notes'):
-            print("notes table doesn't exist yet, skipping migration")
-            return True
-        
-        # Check if the pinned column already exists
-        if check_column_exists(cursor, 'notes', 'pinned'):
-            print("✅ pinned column already exists, marking as applied")
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            return True
-        
-        print(f"📝 Running Migration {migration_name}: Adding pinned column for note pinning...")
-        
-        # Add the pinned column
+    logger.info('📝 Running Migration 005_add_pinned_field: Adding pinned column for note pinning...')
+    
+    # Add the pinned column
+    cursor.execute('''
+        ALTER TABLE notes 
+        ADD COLUMN pinned BOOLEAN NOT NULL DEFAULT FALSE
+    ''')
+    
+    # Create index for better performance (pinned notes will be sorted first)
+    logger.debug('   - Creating performance index...')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_user_pinned 
+        ON notes(user_id, pinned, position)
+    ''')
+    
+    logger.info('✅ Migration 005_add_pinned_field completed successfully!')
+    logger.debug('   - Added pinned column to notes table')
+    logger.debug('   - Created performance index for sorting')
+    logger.debug('   - Pin/unpin functionality is now ready!')
+    return True
+
+@migration("006_add_reminder_fields")
+def run_migration_006_add_reminder_fields(cursor):
+    """Migration 006: Add reminder fields to notes table for date/time reminders"""
+    # Check if notes table exists
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
+        return False
+    
+    logger.info('🔄 Applying migration 006_add_reminder_fields...')
+    notes_columns = get_table_columns(cursor, 'notes')
+    
+    # Add reminder_datetime column for when to remind user
+    if 'reminder_datetime' not in notes_columns:
+        logger.debug('   - Adding reminder_datetime column...')
         cursor.execute('''
             ALTER TABLE notes 
-            ADD COLUMN pinned BOOLEAN NOT NULL DEFAULT FALSE
+            ADD COLUMN reminder_datetime DATETIME NULL
         ''')
-        
-        # Create index for better performance (pinned notes will be sorted first)
-        print("   - Creating performance index...")
+    else:
+        logger.debug('   - reminder_datetime column already exists')
+    
+    # Add reminder_completed column for whether reminder was acknowledged
+    if 'reminder_completed' not in notes_columns:
+        logger.debug('   - Adding reminder_completed column...')
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notes_user_pinned 
-            ON notes(user_id, pinned, position)
+            ALTER TABLE notes 
+            ADD COLUMN reminder_completed BOOLEAN NOT NULL DEFAULT FALSE
         ''')
-        
-        # Get count of notes for confirmation
-        cursor.execute("SELECT COUNT(*) FROM notes")
-        total_notes = cursor.fetchone()[0]
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print(f"   - Added pinned column to notes table")
-        print(f"   - {total_notes} notes are ready for pinning")
-        print(f"   - Created performance index for sorting")
-        print(f"   - Pin/unpin functionality is now ready!")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def run_migration_006_add_reminder_fields():
-    """Migration 006: Add reminder fields to notes table for date/time reminders"""
-    migration_name = "006_add_reminder_fields"
-    db_path = get_db_path()
+    else:
+        logger.debug('   - reminder_completed column already exists')
     
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    # Add reminder_snoozed_until column for snooze functionality
+    if 'reminder_snoozed_until' not in notes_columns:
+        logger.debug('   - Adding reminder_snoozed_until column...')
+        cursor.execute('''
+            ALTER TABLE notes 
+            ADD COLUMN reminder_snoozed_until DATETIME NULL
+        ''')
+    else:
+        logger.debug('   - reminder_snoozed_until column already exists')
     
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
+    # Create index for better performance when querying active reminders
+    logger.debug('   - Creating performance index for reminders...')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_reminders 
+        ON notes(reminder_datetime, reminder_completed, user_id)
+    ''')
     
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied, skipping")
-            return True
-        
-        # Check if notes table exists
-        if not check_table_exists(cursor, 'notes'):
-            print("notes table doesn't exist yet, skipping migration")
-            return True
-        
-        print(f"🔄 Applying migration {migration_name}...")
-        
-        # Add reminder_datetime column for when to remind user
-        if not check_column_exists(cursor, 'notes', 'reminder_datetime'):
-            print("   - Adding reminder_datetime column...")
-            cursor.execute('''
-                ALTER TABLE notes 
-                ADD COLUMN reminder_datetime DATETIME NULL
-            ''')
-        else:
-            print("   - reminder_datetime column already exists")
-        
-        # Add reminder_completed column for whether reminder was acknowledged
-        if not check_column_exists(cursor, 'notes', 'reminder_completed'):
-            print("   - Adding reminder_completed column...")
-            cursor.execute('''
-                ALTER TABLE notes 
-                ADD COLUMN reminder_completed BOOLEAN NOT NULL DEFAULT FALSE
-            ''')
-        else:
-            print("   - reminder_completed column already exists")
-        
-        # Add reminder_snoozed_until column for snooze functionality
-        if not check_column_exists(cursor, 'notes', 'reminder_snoozed_until'):
-            print("   - Adding reminder_snoozed_until column...")
-            cursor.execute('''
-                ALTER TABLE notes 
-                ADD COLUMN reminder_snoozed_until DATETIME NULL
-            ''')
-        else:
-            print("   - reminder_snoozed_until column already exists")
-        
-        # Create index for better performance when querying active reminders
-        print("   - Creating performance index for reminders...")
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notes_reminders 
-            ON notes(reminder_datetime, reminder_completed, user_id)
-        ''')
-        
-        # Get count of notes for confirmation
-        cursor.execute("SELECT COUNT(*) FROM notes")
-        total_notes = cursor.fetchone()[0]
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print(f"   - Added reminder_datetime column to notes table")
-        print(f"   - Added reminder_completed column to notes table")
-        print(f"   - Added reminder_snoozed_until column to notes table")
-        print(f"   - {total_notes} notes are ready for reminders")
-        print(f"   - Created performance index for reminder queries")
-        print(f"   - Date/time reminder functionality is now ready!")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def run_migration_007_create_performance_indexes():
+    logger.info('✅ Migration 006_add_reminder_fields completed successfully!')
+    logger.debug('   - Added reminder_datetime column to notes table')
+    logger.debug('   - Added reminder_completed column to notes table')
+    logger.debug('   - Added reminder_snoozed_until column to notes table')
+    logger.debug('   - Created performance index for reminder queries')
+    logger.debug('   - Date/time reminder functionality is now ready!')
+    return True
+
+# (sql, description) pairs for migration 007. They all run inside the single
+# BEGIN IMMEDIATE transaction opened by _run_migration, so the set is created
+# atomically: one commit/fsync for every index, and a failure part-way through
+# rolls back to no new indexes instead of leaving a half-indexed schema.
+PERFORMANCE_INDEXES = [
+    # Index for notes queries by user_id (most common query)
+    ("""CREATE INDEX IF NOT EXISTS idx_notes_user_id_pinned_position
+        ON notes(user_id, pinned DESC, position ASC)""",
+     "notes(user_id, pinned, position)"),
+    # Indexes for shared notes queries (see migration 015)
+    ("""CREATE INDEX IF NOT EXISTS idx_shared_notes_user_visible
+        ON shared_notes(user_id, note_id)
+        WHERE hidden_by_recipient = 0""",
+     "shared_notes(user_id, note_id) for visible shares"),
+    ("""CREATE INDEX IF NOT EXISTS idx_shared_notes_user_hidden
+        ON shared_notes(user_id, note_id)
+        WHERE hidden_by_recipient = 1""",
+     "shared_notes(user_id, note_id) for hidden shares"),
+    # Index for shared notes by note_id (for joins), extended with user_id so
+    # per-share access checks are a single seek (see migration 018)
+    ("""CREATE INDEX IF NOT EXISTS idx_shared_notes_note_user
+        ON shared_notes(note_id, user_id)""",
+     "shared_notes(note_id, user_id)"),
+    # Index for checklist items by note_id
+    ("""CREATE INDEX IF NOT EXISTS idx_checklist_items_note_id_order
+        ON checklist_items(note_id, `order`)""",
+     "checklist_items(note_id, order)"),
+    # Reverse lookup for note-label associations; note_id lookups use the
+    # (note_id, label_id) primary key (see migration 016)
+    ("""CREATE INDEX IF NOT EXISTS idx_note_labels_label_id
+        ON note_labels(label_id)""",
+     "note_labels(label_id)"),
+    # Index for labels by user_id
+    ("""CREATE INDEX IF NOT EXISTS idx_labels_user_id
+        ON labels(user_id)""",
+     "labels(user_id)"),
+    # Index for per-user reminder queries (see migration 014)
+    ("""CREATE INDEX IF NOT EXISTS idx_notes_user_reminder
+        ON notes(user_id, reminder_datetime)
+        WHERE reminder_datetime IS NOT NULL""",
+     "notes(user_id, reminder_datetime)"),
+]
+
+@migration("007_create_performance_indexes")
+def run_migration_007_create_performance_indexes(cursor):
     """Migration 007: Create performance indexes for better query performance"""
-    migration_name = "007_create_performance_indexes"
-    db_path = get_db_path()
-    
-    # Ensure the database directory exists
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
-    
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
-    
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create migration tracking table
-        create_migration_table(cursor)
-        
-        # Check if this migration has already been applied
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-        
-        print(f"📝 Running Migration {migration_name}: Creating performance indexes...")
-        
-        # Index for notes queries by user_id (most common query)
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notes_user_id_pinned_position 
-            ON notes(user_id, pinned DESC, position ASC)
-        ''')
-        print("   - Created index on notes(user_id, pinned, position)")
-        
-        # Index for shared notes queries
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_shared_notes_user_id_hidden 
-            ON shared_notes(user_id, hidden_by_recipient)
-        ''')
-        print("   - Created index on shared_notes(user_id, hidden_by_recipient)")
-        
-        # Index for shared notes by note_id (for joins)
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_shared_notes_note_id 
-            ON shared_notes(note_id)
-        ''')
-        print("   - Created index on shared_notes(note_id)")
-        
-        # Index for checklist items by note_id
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_checklist_items_note_id_order 
-            ON checklist_items(note_id, `order`)
-        ''')
-        print("   - Created index on checklist_items(note_id, order)")
-        
-        # Index for note-label associations
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_note_labels_note_id 
-            ON note_labels(note_id)
-        ''')
-        print("   - Created index on note_labels(note_id)")
-        
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_note_labels_label_id 
-            ON note_labels(label_id)
-        ''')
-        print("   - Created index on note_labels(label_id)")
-        
-        # Index for labels by user_id
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_labels_user_id 
-            ON labels(user_id)
-        ''')
-        print("   - Created index on labels(user_id)")
-        
-        # Index for reminder queries
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_notes_reminder_datetime 
-            ON notes(reminder_datetime) 
-            WHERE reminder_datetime IS NOT NULL
-        ''')
-        print("   - Created index on notes(reminder_datetime)")
-        
-        # Mark migration as applied
-        mark_migration_applied(cursor, migration_name)
-        
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print(f"   - Created 8 performance indexes")
-        print(f"   - Database queries should now be significantly faster")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def run_migration_008_make_label_color_nullable():
+    logger.info('📝 Running Migration 007_create_performance_indexes: Creating performance indexes...')
+
+    for sql, description in PERFORMANCE_INDEXES:
+        cursor.execute(sql)
+        logger.debug('   - Created index on %s', description)
+
+    logger.info('✅ Migration 007_create_performance_indexes completed successfully!')
+    logger.debug('   - Created %s performance indexes', len(PERFORMANCE_INDEXES))
+    logger.debug('   - Database queries should now be significantly faster')
+    return True
+
+# Explicitly disable FK enforcement during the rebuild. DROP TABLE labels would
+# otherwise ON DELETE CASCADE and wipe every note_labels association. sqlite3
+# defaults this OFF, but we set it explicitly so correctness does not silently
+# depend on that default.
+@migration("008_make_label_color_nullable", foreign_keys_off=True)
+def run_migration_008_make_label_color_nullable(cursor):
     """Migration 008: Make labels.color nullable so NULL means 'inherit from parent'.
 
     Migration 003 created labels.color as NOT NULL DEFAULT '#3b82f6'. The model now
     treats NULL as "inherit", so inserting a label without a color must be allowed.
     SQLite can't ALTER a column's nullability, so the table is rebuilt.
     """
-    migration_name = "008_make_label_color_nullable"
-    db_path = get_db_path()
-
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
-
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
+    # If labels doesn't exist yet, the model/migration 003 will create it
+    # correctly (model is now nullable); nothing to rebuild.
+    if not check_table_exists(cursor, 'labels'):
+        logger.debug("labels table doesn't exist yet, marking migration as applied")
         return True
 
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Explicitly disable FK enforcement during the rebuild. DROP TABLE labels
-        # would otherwise ON DELETE CASCADE and wipe every note_labels association.
-        # sqlite3 defaults this OFF, but we set it explicitly so correctness does
-        # not silently depend on that default.
-        cursor.execute("PRAGMA foreign_keys=OFF")
-
-        create_migration_table(cursor)
+    # Detect whether color is already nullable; if so, skip the rebuild.
+    cursor.execute(
+        'SELECT "notnull" FROM pragma_table_info(?) WHERE name = ?',
+        ('labels', 'color'),
+    )
+    row = cursor.fetchone()
+    color_notnull = row[0] if row else None
 
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
-
-        # If labels doesn't exist yet, the model/migration 003 will create it
-        # correctly (model is now nullable); nothing to rebuild.
-        if not check_table_exists(cursor, 'labels'):
-            print("labels table doesn't exist yet, marking migration as applied")
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            return True
-
-        # Detect whether color is already nullable; if so, skip the rebuild.
-        cursor.execute("PRAGMA table_info(labels)")
-        color_notnull = None
-        for row in cursor.fetchall():
-            # row: (cid, name, type, notnull, dflt_value, pk)
-            if row[1] == 'color':
-                color_notnull = row[3]
-                break
+    if color_notnull == 0:
+        logger.debug('✅ labels.color is already nullable, marking as applied')
+        return True
 
-        if color_notnull == 0:
-            print("✅ labels.color is already nullable, marking as applied")
-            mark_migration_applied(cursor, migration_name)
-            conn.commit()
-            return True
+    logger.info('📝 Running Migration 008_make_label_color_nullable: Rebuilding labels table with nullable color...')
 
-        print(f"📝 Running Migration {migration_name}: Rebuilding labels table with nullable color...")
+    # Rebuild the table (SQLite cannot drop a NOT NULL constraint in place).
+    # Foreign keys are off by default per-connection, so a straight rename/copy is safe here.
+    cursor.execute('''
+        CREATE TABLE labels_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            color VARCHAR(20) NULL,
+            parent_id INTEGER NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_id) REFERENCES labels (id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO labels_new (id, name, color, parent_id, user_id, created_at, updated_at)
+        SELECT id, name, color, parent_id, user_id, created_at, updated_at FROM labels
+    ''')
+    cursor.execute("DROP TABLE labels")
+    cursor.execute("ALTER TABLE labels_new RENAME TO labels")
 
-        # Rebuild the table (SQLite cannot drop a NOT NULL constraint in place).
-        # Foreign keys are off by default per-connection, so a straight rename/copy is safe here.
-        cursor.execute('''
-            CREATE TABLE labels_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name VARCHAR(100) NOT NULL,
-                color VARCHAR(20) NULL,
-                parent_id INTEGER NULL,
-                user_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (parent_id) REFERENCES labels (id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        cursor.execute('''
-            INSERT INTO labels_new (id, name, color, parent_id, user_id, created_at, updated_at)
-            SELECT id, name, color, parent_id, user_id, created_at, updated_at FROM labels
-        ''')
-        cursor.execute("DROP TABLE labels")
-        cursor.execute("ALTER TABLE labels_new RENAME TO labels")
+    # Recreate the indexes that lived on the old table (from migration 003).
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_user_id ON labels (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_parent_id ON labels (parent_id)')
 
-        # Recreate the indexes that lived on the old table (from migration 003).
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_user_id ON labels (user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_labels_parent_id ON labels (parent_id)')
+    logger.info('✅ Migration 008_make_label_color_nullable completed successfully!')
+    logger.debug('   - labels.color is now nullable (NULL = inherit from parent)')
+    return True
 
-        mark_migration_applied(cursor, migration_name)
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - labels.color is now nullable (NULL = inherit from parent)")
-        return True
 
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        if conn:
-            conn.rollback()
+@migration("009_add_location_reminder_fields")
+def run_migration_009_add_location_reminder_fields(cursor):
+    """Migration 009: Add location-based reminder fields to the notes table."""
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
         return False
-    finally:
-        if conn:
-            conn.close()
-
 
-def run_migration_009_add_location_reminder_fields():
-    """Migration 009: Add location-based reminder fields to the notes table."""
-    migration_name = "009_add_location_reminder_fields"
-    db_path = get_db_path()
+    logger.info('📝 Running Migration 009_add_location_reminder_fields: Adding location reminder fields...')
 
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    columns = [
+        ('reminder_latitude', 'FLOAT NULL'),
+        ('reminder_longitude', 'FLOAT NULL'),
+        ('reminder_radius', 'INTEGER NULL'),
+        ('reminder_location_name', 'VARCHAR(200) NULL'),
+    ]
+    notes_columns = get_table_columns(cursor, 'notes')
+    for name, ddl in columns:
+        if name not in notes_columns:
+            logger.debug('   - Adding %s column...', name)
+            cursor.execute(f"ALTER TABLE notes ADD COLUMN {name} {ddl}")
+            notes_columns.add(name)
+        else:
+            logger.debug('   - %s column already exists', name)
 
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
+    logger.info('✅ Migration 009_add_location_reminder_fields completed successfully!')
+    logger.debug('   - Location-based reminders are now ready!')
+    return True
 
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
 
-        create_migration_table(cursor)
+@migration("010_create_attachments_table")
+def run_migration_010_create_attachments_table(cursor):
+    """Migration 010: Create the attachments table for note file attachments."""
+    logger.info('📝 Running Migration 010_create_attachments_table: Creating attachments table...')
 
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            uploader_id INTEGER NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            original_filename VARCHAR(255) NULL,
+            mime_type VARCHAR(100) NOT NULL,
+            file_size INTEGER NOT NULL DEFAULT 0,
+            attachment_type VARCHAR(10) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
+            FOREIGN KEY (uploader_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attachments_note_id ON attachments (note_id)')
 
-        if not check_table_exists(cursor, 'notes'):
-            print("notes table doesn't exist yet, skipping migration")
-            return True
+    logger.info('✅ Migration 010_create_attachments_table completed successfully!')
+    logger.debug('   - File attachments (images/audio) are now ready!')
+    return True
 
-        print(f"📝 Running Migration {migration_name}: Adding location reminder fields...")
-
-        columns = [
-            ('reminder_latitude', 'FLOAT NULL'),
-            ('reminder_longitude', 'FLOAT NULL'),
-            ('reminder_radius', 'INTEGER NULL'),
-            ('reminder_location_name', 'VARCHAR(200) NULL'),
-        ]
-        for name, ddl in columns:
-            if not check_column_exists(cursor, 'notes', name):
-                print(f"   - Adding {name} column...")
-                cursor.execute(f"ALTER TABLE notes ADD COLUMN {name} {ddl}")
-            else:
-                print(f"   - {name} column already exists")
-
-        mark_migration_applied(cursor, migration_name)
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - Location-based reminders are now ready!")
-        return True
 
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        if conn:
-            conn.rollback()
+@migration("011_add_note_client_id")
+def run_migration_011_add_note_client_id(cursor):
+    """Migration 011: Add client_id to notes for idempotent offline creation."""
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
         return False
-    finally:
-        if conn:
-            conn.close()
-
-
-def run_migration_010_create_attachments_table():
-    """Migration 010: Create the attachments table for note file attachments."""
-    migration_name = "010_create_attachments_table"
-    db_path = get_db_path()
-
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
-
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
 
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+    if not check_column_exists(cursor, 'notes', 'client_id'):
+        logger.info('📝 Running Migration 011_add_note_client_id: Adding client_id column...')
+        cursor.execute("ALTER TABLE notes ADD COLUMN client_id VARCHAR(64) NULL")
+    else:
+        logger.debug('   - client_id column already exists')
 
-        create_migration_table(cursor)
+    # Partial unique index enforces idempotency per user without constraining
+    # the many existing rows that have a NULL client_id.
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_user_client_id
+        ON notes (user_id, client_id)
+        WHERE client_id IS NOT NULL
+    ''')
 
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
+    logger.info('✅ Migration 011_add_note_client_id completed successfully!')
+    logger.debug('   - Idempotent offline note creation is now supported!')
+    return True
 
-        print(f"📝 Running Migration {migration_name}: Creating attachments table...")
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attachments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                note_id INTEGER NOT NULL,
-                uploader_id INTEGER NOT NULL,
-                filename VARCHAR(255) NOT NULL,
-                original_filename VARCHAR(255) NULL,
-                mime_type VARCHAR(100) NOT NULL,
-                file_size INTEGER NOT NULL DEFAULT 0,
-                attachment_type VARCHAR(10) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
-                FOREIGN KEY (uploader_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attachments_note_id ON attachments (note_id)')
+@migration("012_create_deleted_notes_table")
+def run_migration_012_create_deleted_notes_table(cursor):
+    """Migration 012: Create the deleted_notes tombstone table for delta-sync."""
+    logger.info('📝 Running Migration 012_create_deleted_notes_table: Creating deleted_notes table...')
 
-        mark_migration_applied(cursor, migration_name)
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - File attachments (images/audio) are now ready!")
-        return True
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deleted_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_deleted_notes_user_deleted ON deleted_notes (user_id, deleted_at)')
 
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    finally:
-        if conn:
-            conn.close()
+    logger.info('✅ Migration 012_create_deleted_notes_table completed successfully!')
+    logger.debug('   - Delta-sync tombstones are now supported!')
+    return True
 
 
-def run_migration_011_add_note_client_id():
-    """Migration 011: Add client_id to notes for idempotent offline creation."""
-    migration_name = "011_add_note_client_id"
-    db_path = get_db_path()
+@migration("013_add_private_notes")
+def run_migration_013_add_private_notes(cursor):
+    """Migration 013: Add notes.is_private and users.private_pin_hash for PIN-gated notes."""
+    logger.info('📝 Running Migration 013_add_private_notes: Adding private-notes fields...')
 
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    if check_table_exists(cursor, 'notes') and not check_column_exists(cursor, 'notes', 'is_private'):
+        cursor.execute("ALTER TABLE notes ADD COLUMN is_private BOOLEAN NOT NULL DEFAULT 0")
+        logger.debug('   - Added notes.is_private')
+    if check_table_exists(cursor, 'users') and not check_column_exists(cursor, 'users', 'private_pin_hash'):
+        cursor.execute("ALTER TABLE users ADD COLUMN private_pin_hash VARCHAR(255) NULL")
+        logger.debug('   - Added users.private_pin_hash')
 
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
+    logger.info('✅ Migration 013_add_private_notes completed successfully!')
+    logger.debug('   - PIN-gated private notes are now supported!')
+    return True
 
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
 
-        create_migration_table(cursor)
+@migration("014_rebuild_reminder_index")
+def run_migration_014_rebuild_reminder_index(cursor):
+    """Migration 014: Lead the partial reminder index with user_id.
 
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
+    Reminder lookups are always scoped to one user, so the old
+    notes(reminder_datetime) index could not seek on the user. The partial
+    predicate is kept: any reminder_datetime comparison implies IS NOT NULL,
+    so SQLite can still pick it, and notes without a reminder stay out of it.
+    """
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
+        return False
 
-        if not check_table_exists(cursor, 'notes'):
-            print("notes table doesn't exist yet, skipping migration")
-            return True
+    logger.info('📝 Running Migration 014_rebuild_reminder_index: Rebuilding reminder index...')
+    cursor.execute("DROP INDEX IF EXISTS idx_notes_reminder_datetime")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_user_reminder
+        ON notes(user_id, reminder_datetime)
+        WHERE reminder_datetime IS NOT NULL
+    ''')
 
-        if not check_column_exists(cursor, 'notes', 'client_id'):
-            print(f"📝 Running Migration {migration_name}: Adding client_id column...")
-            cursor.execute("ALTER TABLE notes ADD COLUMN client_id VARCHAR(64) NULL")
-        else:
-            print("   - client_id column already exists")
+    logger.info('✅ Migration 014_rebuild_reminder_index completed successfully!')
+    return True
 
-        # Partial unique index enforces idempotency per user without constraining
-        # the many existing rows that have a NULL client_id.
-        cursor.execute('''
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_user_client_id
-            ON notes (user_id, client_id)
-            WHERE client_id IS NOT NULL
-        ''')
 
-        mark_migration_applied(cursor, migration_name)
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - Idempotent offline note creation is now supported!")
-        return True
+@migration("015_partial_shared_notes_indexes")
+def run_migration_015_partial_shared_notes_indexes(cursor):
+    """Migration 015: Split the shared_notes user index by hidden_by_recipient.
 
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        if conn:
-            conn.rollback()
+    Share lookups always filter on hidden_by_recipient = 0 (visible) or = 1
+    (hidden list); SQLAlchemy renders the boolean comparisons as exactly those
+    literals, so each query matches one smaller partial index.
+    """
+    if not check_table_exists(cursor, 'shared_notes'):
+        logger.debug("shared_notes table doesn't exist yet, skipping migration")
         return False
-    finally:
-        if conn:
-            conn.close()
 
+    logger.info('📝 Running Migration 015_partial_shared_notes_indexes: Rebuilding shared_notes indexes...')
+    cursor.execute("DROP INDEX IF EXISTS idx_shared_notes_user_id_hidden")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shared_notes_user_visible
+        ON shared_notes(user_id, note_id)
+        WHERE hidden_by_recipient = 0
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shared_notes_user_hidden
+        ON shared_notes(user_id, note_id)
+        WHERE hidden_by_recipient = 1
+    ''')
 
-def run_migration_012_create_deleted_notes_table():
-    """Migration 012: Create the deleted_notes tombstone table for delta-sync."""
-    migration_name = "012_create_deleted_notes_table"
-    db_path = get_db_path()
+    logger.info('✅ Migration 015_partial_shared_notes_indexes completed successfully!')
+    return True
 
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
 
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
+@migration("016_note_labels_without_rowid")
+def run_migration_016_note_labels_without_rowid(cursor):
+    """Migration 016: Rebuild note_labels as a WITHOUT ROWID table keyed on (note_id, label_id).
 
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+    The surrogate id was never used to look rows up; every query goes through
+    note_id or label_id. Clustering rows on the pair shrinks the table, makes
+    idx_note_labels_note_id redundant (it is the primary-key prefix) and turns
+    note_id joins into a single b-tree seek.
+    """
+    if not check_table_exists(cursor, 'note_labels'):
+        logger.debug("note_labels table doesn't exist yet, skipping migration")
+        return False
 
-        create_migration_table(cursor)
+    if not check_column_exists(cursor, 'note_labels', 'id'):
+        # Created from the model; migration 003 may still have added the
+        # now-redundant note_id index on top of it.
+        cursor.execute("DROP INDEX IF EXISTS idx_note_labels_note_id")
+        logger.debug('✅ note_labels is already keyed on (note_id, label_id), marking as applied')
+        return True
 
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
+    logger.info('📝 Running Migration 016_note_labels_without_rowid: Rebuilding note_labels...')
 
-        print(f"📝 Running Migration {migration_name}: Creating deleted_notes table...")
+    # Nothing references note_labels, so dropping it cascades nowhere. Rows are
+    # copied in key order so the new b-tree is filled by appends; OR IGNORE
+    # collapses any duplicate pairs from databases that predate the UNIQUE
+    # constraint. The label_id index is built only after the copy.
+    cursor.execute('''
+        CREATE TABLE note_labels_new (
+            note_id INTEGER NOT NULL,
+            label_id INTEGER NOT NULL,
+            created_at DATETIME,
+            PRIMARY KEY (note_id, label_id),
+            FOREIGN KEY (note_id) REFERENCES notes (id),
+            FOREIGN KEY (label_id) REFERENCES labels (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO note_labels_new (note_id, label_id, created_at)
+        SELECT note_id, label_id, created_at FROM note_labels
+        ORDER BY note_id, label_id
+    ''')
+    cursor.execute("DROP TABLE note_labels")
+    cursor.execute("ALTER TABLE note_labels_new RENAME TO note_labels")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_note_labels_label_id ON note_labels (label_id)')
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS deleted_notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                note_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_deleted_notes_user_deleted ON deleted_notes (user_id, deleted_at)')
+    logger.info('✅ Migration 016_note_labels_without_rowid completed successfully!')
+    return True
 
-        mark_migration_applied(cursor, migration_name)
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - Delta-sync tombstones are now supported!")
-        return True
 
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        if conn:
-            conn.rollback()
+@migration("017_add_notes_user_updated_index")
+def run_migration_017_add_notes_user_updated_index(cursor):
+    """Migration 017: Index notes by (user_id, updated_at) for recency and delta-sync queries."""
+    if not check_table_exists(cursor, 'notes'):
+        logger.debug("notes table doesn't exist yet, skipping migration")
         return False
-    finally:
-        if conn:
-            conn.close()
-
 
-def run_migration_013_add_private_notes():
-    """Migration 013: Add notes.is_private and users.private_pin_hash for PIN-gated notes."""
-    migration_name = "013_add_private_notes"
-    db_path = get_db_path()
+    logger.info('📝 Running Migration 017_add_notes_user_updated_index: Creating recency index...')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_user_updated
+        ON notes(user_id, updated_at DESC)
+    ''')
 
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except Exception as e:
-            print(f"Warning: Could not create database directory {db_dir}: {e}")
+    logger.info('✅ Migration 017_add_notes_user_updated_index completed successfully!')
+    return True
 
-    if not os.path.exists(db_path):
-        print(f"Database not found at {db_path}, will be created when app starts")
-        return True
 
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+@migration("018_shared_notes_note_user_index")
+def run_migration_018_shared_notes_note_user_index(cursor):
+    """Migration 018: Replace the shared_notes(note_id) index with (note_id, user_id).
 
-        create_migration_table(cursor)
+    Every permission check looks a share up by note and user together; the
+    composite index answers those with one seek and still serves note_id-only
+    joins as its prefix, so the single-column index is dropped.
+    """
+    if not check_table_exists(cursor, 'shared_notes'):
+        logger.debug("shared_notes table doesn't exist yet, skipping migration")
+        return False
 
-        if is_migration_applied(cursor, migration_name):
-            print(f"✅ Migration {migration_name} already applied")
-            return True
+    logger.info('📝 Running Migration 018_shared_notes_note_user_index: Rebuilding shared_notes note index...')
+    cursor.execute("DROP INDEX IF EXISTS idx_shared_notes_note_id")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shared_notes_note_user
+        ON shared_notes(note_id, user_id)
+    ''')
 
-        print(f"📝 Running Migration {migration_name}: Adding private-notes fields...")
+    logger.info('✅ Migration 018_shared_notes_note_user_index completed successfully!')
+    return True
 
-        if check_table_exists(cursor, 'notes') and not check_column_exists(cursor, 'notes', 'is_private'):
-            cursor.execute("ALTER TABLE notes ADD COLUMN is_private BOOLEAN NOT NULL DEFAULT 0")
-            print("   - Added notes.is_private")
-        if check_table_exists(cursor, 'users') and not check_column_exists(cursor, 'users', 'private_pin_hash'):
-            cursor.execute("ALTER TABLE users ADD COLUMN private_pin_hash VARCHAR(255) NULL")
-            print("   - Added users.private_pin_hash")
 
-        mark_migration_applied(cursor, migration_name)
-        conn.commit()
-        print(f"✅ Migration {migration_name} completed successfully!")
-        print("   - PIN-gated private notes are now supported!")
-        return True
+@migration("019_labels_unique_name_index")
+def run_migration_019_labels_unique_name_index(cursor):
+    """Migration 019: Enforce unique label names per user and parent.
 
-    except sqlite3.Error as e:
-        print(f"❌ Migration {migration_name} failed: {e}")
-        if conn:
-            conn.rollback()
-        return False
-    except Exception as e:
-        print(f"❌ Unexpected error in Migration {migration_name}: {e}")
-        if conn:
-            conn.rollback()
+    create_label/update_label rely on this index instead of a SELECT before
+    every write. parent_id is indexed as COALESCE(parent_id, 0) because SQLite
+    treats NULLs as distinct, which would let top-level duplicates through.
+    Existing duplicates (possible before the constraint) are renamed by
+    appending their id, so no label or note association is lost.
+    """
+    if not check_table_exists(cursor, 'labels'):
+        logger.debug("labels table doesn't exist yet, skipping migration")
         return False
-    finally:
-        if conn:
-            conn.close()
 
+    logger.info('📝 Running Migration 019_labels_unique_name_index: Creating unique label name index...')
+    cursor.execute('''
+        UPDATE labels SET name = name || ' (' || id || ')'
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM labels
+            GROUP BY user_id, name, COALESCE(parent_id, 0)
+        )
+    ''')
+    if cursor.rowcount:
+        logger.info('   - Renamed %s duplicate label(s)', cursor.rowcount)
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_labels_user_name_parent
+        ON labels(user_id, name, COALESCE(parent_id, 0))
+    ''')
 
-def run_all_migrations():
-    """Run all pending migrations"""
-    print("🚀 Starting automatic database migrations...")
-    print(f"Current working directory: {os.getcwd()}")
-    print(f"Environment check - /app exists: {os.path.exists('/app')}")
+    logger.info('✅ Migration 019_labels_unique_name_index completed successfully!')
+    return True
+
+
+# Every migration, in the order it must be applied.
+MIGRATIONS = [
+    run_migration_000_cleanup_duplicate_tables,
+    run_migration_001_add_hidden_by_recipient,
+    run_migration_002_add_color_field,
+    run_migration_003_create_labels_system,
+    run_migration_004_add_position_field,  # NEW: Add position field for drag & drop
+    run_migration_005_add_pinned_field,    # NEW: Add pinned field for note pinning
+    run_migration_006_add_reminder_fields, # NEW: Add reminder fields for date/time reminders
+    run_migration_007_create_performance_indexes, # NEW: Create performance indexes
+    run_migration_008_make_label_color_nullable, # NEW: Make labels.color nullable (NULL = inherit)
+    run_migration_009_add_location_reminder_fields, # NEW: Add location-based reminder fields
+    run_migration_010_create_attachments_table, # NEW: Create attachments table for file uploads
+    run_migration_011_add_note_client_id, # NEW: Add client_id for idempotent offline creation
+    run_migration_012_create_deleted_notes_table, # NEW: Tombstones for delta-sync
+    run_migration_013_add_private_notes, # NEW: PIN-gated private notes
+    run_migration_014_rebuild_reminder_index, # NEW: Per-user partial reminder index
+    run_migration_015_partial_shared_notes_indexes, # NEW: Partial visible/hidden share indexes
+    run_migration_016_note_labels_without_rowid, # NEW: Cluster note_labels on (note_id, label_id)
+    run_migration_017_add_notes_user_updated_index, # NEW: (user_id, updated_at) recency index
+    run_migration_018_shared_notes_note_user_index, # NEW: (note_id, user_id) share lookups
+    run_migration_019_labels_unique_name_index, # NEW: Unique (user_id, name, parent_id) labels
+    # Add future migrations here
+]
+
+def run_all_migrations(migrations=None):
+    """Run all pending migrations (or only the given subset of MIGRATIONS)"""
+    if migrations is None:
+        migrations = MIGRATIONS
+
+    logger.info('🚀 Starting automatic database migrations...')
+    # Filesystem probe for diagnosing volume mounts. Opt-in: it stat()s and lists
+    # the image's directories, which is wasted work on every normal start.
+    if os.environ.get('FRIDGENOTES_DEBUG_MIGRATIONS'):
+        logger.info('Current working directory: %s', os.getcwd())
+        logger.info('Environment check - /app exists: %s', os.path.exists('/app'))
+        if os.path.exists('/app'):
+            logger.info('Docker environment detected')
+            try:
+                logger.info('Contents of /app: %s', os.listdir('/app'))
+                if os.path.exists('/app/src'):
+                    logger.info('Contents of /app/src: %s', os.listdir('/app/src'))
+                if os.path.exists('/app/src/database'):
+                    logger.info('Contents of /app/src/database: %s', os.listdir('/app/src/database'))
+            except Exception as e:
+                logger.info('Error listing directories: %s', e)
     
-    # Debug: Print what we can see in the file system
-    if os.path.exists('/app'):
-        print("Docker environment detected")
+    # One connection for the whole run, and one history read up front: migrations
+    # already applied are skipped outright, pending ones reuse the connection.
+    # Each pending migration still re-checks under its own BEGIN IMMEDIATE lock.
+    applied = frozenset()
+    conn = None
+    db_path = get_db_path()
+    if os.path.exists(db_path):
         try:
-            print(f"Contents of /app: {os.listdir('/app')}")
-            if os.path.exists('/app/src'):
-                print(f"Contents of /app/src: {os.listdir('/app/src')}")
-            if os.path.exists('/app/src/database'):
-                print(f"Contents of /app/src/database: {os.listdir('/app/src/database')}")
-        except Exception as e:
-            print(f"Error listing directories: {e}")
-    
-    migrations = [
-        run_migration_000_cleanup_duplicate_tables,
-        run_migration_001_add_hidden_by_recipient,
-        run_migration_002_add_color_field,
-        run_migration_003_create_labels_system,
-        run_migration_004_add_position_field,  # NEW: Add position field for drag & drop
-        run_migration_005_add_pinned_field,    # NEW: Add pinned field for note pinning
-        run_migration_006_add_reminder_fields, # NEW: Add reminder fields for date/time reminders
-        run_migration_007_create_performance_indexes, # NEW: Create performance indexes
-        run_migration_008_make_label_color_nullable, # NEW: Make labels.color nullable (NULL = inherit)
-        run_migration_009_add_location_reminder_fields, # NEW: Add location-based reminder fields
-        run_migration_010_create_attachments_table, # NEW: Create attachments table for file uploads
-        run_migration_011_add_note_client_id, # NEW: Add client_id for idempotent offline creation
-        run_migration_012_create_deleted_notes_table, # NEW: Tombstones for delta-sync
-        run_migration_013_add_private_notes, # NEW: PIN-gated private notes
-        # Add future migrations here
-    ]
-    
+            conn = connect_db(db_path)
+            cursor = conn.cursor()
+            create_migration_table(cursor)
+            applied = load_applied_migrations(cursor)
+        except sqlite3.Error as e:
+            # Fall back to per-migration connections; each reports its own failure.
+            logger.warning('Could not read migration history: %s', e)
+            if conn:
+                conn.close()
+                conn = None
+
     success_count = 0
-    for i, migration in enumerate(migrations):
-        try:
-            print(f"\n📋 Checking migration {i:03d}...")
-            if migration():
+    ran_pending = False
+    try:
+        for run_migration in migrations:
+            name = run_migration.migration_name
+            if name in applied:
+                logger.debug('✅ Migration %s already applied', name)
                 success_count += 1
-            else:
-                print(f"❌ Migration {i:03d} failed!")
+                continue
+            try:
+                logger.debug('📋 Checking migration %s...', name)
+                ran_pending = True
+                if run_migration(conn):
+                    success_count += 1
+                else:
+                    logger.error('❌ Migration %s failed!', name)
+                    break
+            except Exception as e:
+                logger.exception('❌ Migration %s crashed: %s', name, e)
                 break
-        except Exception as e:
-            print(f"❌ Migration {i:03d} crashed: {e}")
-            import traceback
-            traceback.print_exc()
-            break
+        if conn and ran_pending:
+            # Refresh planner statistics once for everything the run changed.
+            try:
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning('PRAGMA optimize failed: %s', e)
+    finally:
+        if conn:
+            conn.close()
     
     if success_count == len(migrations):
-        print(f"\n🎉 All {len(migrations)} migrations completed successfully!")
+        logger.info('🎉 All %s migrations completed successfully!', len(migrations))
         return True
     else:
-        print(f"\n💥 {len(migrations) - success_count} migrations failed!")
+        logger.error('💥 %s migrations failed!', len(migrations) - success_count)
         return False
 
+def main(argv=None):
+    """Command-line entry point: python src/migrations.py [--list] [MIGRATION ...]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply FridgeNotes database migrations.")
+    parser.add_argument('migrations', nargs='*', metavar='MIGRATION',
+                        help="migration name or numeric prefix (e.g. 004); runs all when omitted")
+    parser.add_argument('--list', action='store_true', help="list known migrations and exit")
+    parser.add_argument('--backup', action='store_true',
+                        help="take an online backup (<db>.bak-<timestamp>) before migrating")
+    parser.add_argument('--backup-to', metavar='PATH',
+                        help="take an online backup to PATH before migrating")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.list:
+        for run_migration in MIGRATIONS:
+            print(run_migration.migration_name)
+        return 0
+
+    selected = MIGRATIONS
+    if args.migrations:
+        matches = lambda m: any(m.migration_name.startswith(prefix) for prefix in args.migrations)
+        selected = [m for m in MIGRATIONS if matches(m)]
+        unknown = [p for p in args.migrations if not any(m.migration_name.startswith(p) for m in MIGRATIONS)]
+        if unknown:
+            parser.error(f"unknown migration(s): {', '.join(unknown)}")
+
+    if args.backup or args.backup_to:
+        from datetime import datetime
+        db_path = get_db_path()
+        if not os.path.exists(db_path):
+            parser.error(f"database not found at {db_path}, nothing to back up")
+        backup_path = args.backup_to or f"{db_path}.bak-{datetime.now():%Y%m%d-%H%M%S}"
+        backup_database(db_path, backup_path)
+        logger.info('💾 Backed up %s to %s', db_path, backup_path)
+
+    return 0 if run_all_migrations(selected) else 1
+
 if __name__ == "__main__":
     # Can be run standalone
-    run_all_migrations()
+    sys.exit(main())
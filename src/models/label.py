@@ -25,12 +25,35 @@ class Label(db.Model):
     def __repr__(self):
         return f'<Label {self.id}: {self.name}>'
     
+    def _lineage(self):
+        """Return [self, parent, grandparent, ...] from one walk up the tree."""
+        chain = [self]
+        parent = self.parent
+        while parent is not None:
+            chain.append(parent)
+            parent = parent.parent
+        return chain
+
+    @staticmethod
+    def _full_name_of(lineage):
+        return ': '.join(label.name for label in reversed(lineage))
+
+    @staticmethod
+    def _display_name_of(lineage):
+        return f"{lineage[1].name}: {lineage[0].name}" if len(lineage) > 1 else lineage[0].name
+
+    @classmethod
+    def _color_of(cls, lineage):
+        # The nearest explicitly set color wins; NULL inherits from the parent.
+        for label in lineage:
+            if label.color:
+                return label.color
+        return cls.DEFAULT_COLOR
+
     @property
     def full_name(self):
         """Get the full hierarchical name like 'Work: Projects: Client A'"""
-        if self.parent:
-            return f"{self.parent.full_name}: {self.name}"
-        return self.name
+        return self._full_name_of(self._lineage())
     
     @property
     def display_name(self):
@@ -41,21 +64,18 @@ class Label(db.Model):
     
     def get_color(self):
         """Resolve the effective color, inheriting from the parent when unset (NULL)."""
-        if self.color:  # Explicitly set (any color, including the default blue)
-            return self.color
-        elif self.parent:  # Not set: inherit from parent
-            return self.parent.get_color()
-        else:  # Not set and no parent: fall back to the default
-            return self.DEFAULT_COLOR
+        return self._color_of(self._lineage())
     
     def to_dict(self, include_hierarchy=False):
         """Serialize the label to a dict, optionally including parent/children."""
+        # One walk up the tree serves the name, display name and color.
+        lineage = self._lineage()
         result = {
             'id': self.id,
             'name': self.name,
-            'display_name': self.display_name,
-            'full_name': self.full_name,
-            'color': self.get_color(),
+            'display_name': self._display_name_of(lineage),
+            'full_name': self._full_name_of(lineage),
+            'color': self._color_of(lineage),
             'parent_id': self.parent_id,
             'user_id': self.user_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -77,12 +97,14 @@ class NoteLabel(db.Model):
 
     __tablename__ = 'note_labels'
 
-    id = db.Column(db.Integer, primary_key=True)
-    note_id = db.Column(db.Integer, db.ForeignKey('notes.id'), nullable=False)
-    label_id = db.Column(db.Integer, db.ForeignKey('labels.id'), nullable=False)
+    # The (note_id, label_id) pair is the key: the table is stored WITHOUT ROWID,
+    # so rows live directly in the primary-key b-tree and note_id lookups need
+    # no separate index (see migration 016).
+    note_id = db.Column(db.Integer, db.ForeignKey('notes.id'), primary_key=True)
+    label_id = db.Column(db.Integer, db.ForeignKey('labels.id'), primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    __table_args__ = (db.UniqueConstraint('note_id', 'label_id', name='unique_note_label'),)
+    __table_args__ = {'sqlite_with_rowid': False}
     
     def __repr__(self):
         return f'<NoteLabel {self.note_id}:{self.label_id}>'
@@ -90,7 +112,6 @@ class NoteLabel(db.Model):
     def to_dict(self):
         """Serialize the note-label association to a dict."""
         return {
-            'id': self.id,
             'note_id': self.note_id,
             'label_id': self.label_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -154,7 +154,7 @@ class SharedNote(db.Model):
             'access_level': self.access_level,
             'shared_at': self.shared_at.isoformat() if self.shared_at else None,
             'hidden_by_recipient': self.hidden_by_recipient,
-            'user': self.user.to_dict() if hasattr(self, 'user') and self.user else None
+            'user': self.user.to_dict() if self.user else None
         }
 
 
@@ -1,11 +1,28 @@
 """User model and SQLAlchemy db instance."""
 
+import time
+
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from src.passwords import hash_password, verify_password
 from flask_login import UserMixin
 from datetime import datetime
 
-db = SQLAlchemy()
+# Sessions are request-scoped, so objects are not expired on commit: responses
+# serialized after a commit (to_dict, current_user) reuse the loaded state
+# instead of re-SELECTing every row. Code that bulk-modifies a relationship
+# behind the ORM's back must expire it explicitly (see update_note).
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+# Short-lived per-process cache for the session user loader: user id ->
+# (expires_at, detached snapshot). Entries are dropped whenever a User row is
+# flushed as updated or deleted, so the TTL only bounds changes made by other
+# processes.
+USER_CACHE_TTL = 30
+USER_CACHE_MAX_SIZE = 1024
+_user_cache = {}
 
 
 class User(UserMixin, db.Model):
@@ -36,21 +53,21 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password):
         """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """Check if the provided password matches the user's password."""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def set_private_pin(self, pin):
         """Hash and set the user's private-notes PIN."""
-        self.private_pin_hash = generate_password_hash(str(pin))
+        self.private_pin_hash = hash_password(str(pin))
 
     def check_private_pin(self, pin):
         """Check the provided PIN against the stored private-notes PIN."""
         if not self.private_pin_hash:
             return False
-        return check_password_hash(self.private_pin_hash, str(pin))
+        return verify_password(self.private_pin_hash, str(pin))
 
     @property
     def has_private_pin(self):
@@ -106,5 +123,43 @@ class User(UserMixin, db.Model):
             (User.username == identifier) | (User.email == identifier)
         ).first()
 
+    @staticmethod
+    def get_cached(user_id):
+        """Get user by id, reusing a recent snapshot instead of re-querying.
+
+        The snapshot is merged into the current session without a SELECT, so
+        the returned instance behaves like one loaded by User.query.get().
+        """
+        entry = _user_cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return db.session.merge(entry[1], load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+                _user_cache.clear()
+            _user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL, _detached_snapshot(user))
+        return user
+
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<User {self.username}>'
+
+
+def _detached_snapshot(user):
+    """Copy a user's loaded column values into a new detached instance.
+
+    The copy never joins a session itself, so later commits cannot expire it;
+    Session.merge(load=False) copies its state into each request's session.
+    """
+    snapshot = sa_inspect(User).class_manager.new_instance()
+    for attr in sa_inspect(User).column_attrs:
+        set_committed_value(snapshot, attr.key, getattr(user, attr.key))
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _forget_cached_user(mapper, connection, target):
+    """Drop a user's cached snapshot once a change to the row is flushed."""
+    _user_cache.pop(target.id, None)
@@ -0,0 +1,33 @@
+"""Password/PIN hashing that doesn't stall the eventlet hub.
+
+werkzeug's PBKDF2 (600k iterations) is hundreds of milliseconds of C code
+that never yields. Under the gunicorn eventlet worker that would freeze every
+request and WebSocket on the single worker, so the work runs on eventlet's
+native thread pool instead. Elsewhere (the flask CLI, the dev server) it runs
+inline.
+"""
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # optional: without eventlet there is no hub to stall
+    patcher = tpool = None
+
+
+def _offload(fn, *args):
+    # Only hand off when eventlet has taken over threading; tpool then runs fn
+    # on a real OS thread and the calling greenlet yields until it finishes.
+    if tpool is not None and patcher.is_monkey_patched('thread'):
+        return tpool.execute(fn, *args)
+    return fn(*args)
+
+
+def hash_password(password):
+    """Return a werkzeug password hash for password."""
+    return _offload(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    """Check password against a werkzeug password hash."""
+    return _offload(check_password_hash, password_hash, password)
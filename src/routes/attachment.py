@@ -11,7 +11,8 @@ import logging
 from flask import Blueprint, jsonify, request, send_file
 from flask_login import login_required, current_user
 
-from src.models.note import Note, SharedNote, Attachment, db
+from src.models.note import Attachment, db
+from src.services.note_service import get_note_and_share
 from src import attachments as storage
 from src.websocket_events import broadcast_note_update
 
@@ -26,10 +27,9 @@ def _get_note_with_access(note_id, require_edit=False):
     If require_edit is True, a shared user must have 'edit' access. On failure
     returns (None, (json, status)); on success returns (note, None).
     """
-    note = Note.query.get_or_404(note_id)
+    note, share = get_note_and_share(note_id, current_user.id)
 
     if note.user_id != current_user.id:
-        share = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
         if not share:
             return None, (jsonify({'error': 'Access denied'}), 403)
         if require_edit and share.access_level != 'edit':
@@ -1,9 +1,13 @@
 """Blueprint for authentication endpoints: register, login, logout, and admin user management."""
 
+import functools
 import os
+import secrets
+from datetime import datetime
 
 from flask import Blueprint, jsonify, request
 from flask_login import login_user, logout_user, login_required, current_user
+from src.passwords import hash_password, verify_password
 from src.models.user import User, db
 from src.limiter import limiter
 
@@ -19,6 +23,15 @@ def registration_enabled():
     return os.environ.get('ALLOW_REGISTRATION', '').strip().lower() in ('1', 'true', 'yes', 'on')
 
 
+@functools.lru_cache(maxsize=1)
+def _dummy_password_hash():
+    """Hash of a random secret, checked when the login identifier matches no account.
+
+    Built on first use (one KDF run) rather than at import.
+    """
+    return hash_password(secrets.token_urlsafe(16))
+
+
 @auth_bp.route('/register', methods=['POST'])
 @limiter.limit('10 per hour')
 def register():
@@ -45,11 +58,13 @@ def register():
             password=data['password'],
             is_admin=False
         )
+        # Registration logs the user straight in: stamp last_login in the same
+        # commit that creates the row rather than a second one.
+        user.last_login = datetime.utcnow()
         db.session.add(user)
         db.session.commit()
 
         login_user(user, remember=True)
-        user.update_last_login()
 
         return jsonify({
             'message': 'Registration successful',
@@ -75,13 +90,18 @@ def login():
     identifier = data.get('username') or data.get('email')
     user = User.get_by_username_or_email(identifier)
 
+    # Always pay for one password hash check, so response time doesn't reveal
+    # whether the username exists or the account is disabled.
     if not user:
+        verify_password(_dummy_password_hash(), data['password'])
         return jsonify({'error': 'Invalid credentials'}), 401
 
+    password_ok = user.check_password(data['password'])
+
     if not user.is_active:
         return jsonify({'error': 'Account is disabled'}), 401
 
-    if not user.check_password(data['password']):
+    if not password_ok:
         return jsonify({'error': 'Invalid credentials'}), 401
 
     remember_me = data.get('remember', False)
@@ -116,17 +136,22 @@ def get_current_user():
 def check_auth():
     """Return authentication status for the current session and server auth config."""
     if current_user.is_authenticated:
-        return jsonify({
+        response = jsonify({
             'authenticated': True,
             'user': current_user.to_dict(),
             'registration_enabled': registration_enabled()
         })
     else:
-        return jsonify({
+        response = jsonify({
             'authenticated': False,
             'user': None,
             'registration_enabled': registration_enabled()
         })
+    # Clients poll this; an unchanged status is answered with a bodiless 304.
+    # no-cache (not max-age) so a logout is never masked by a cached "yes".
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 
 @auth_bp.route('/change-password', methods=['POST'])
@@ -226,7 +251,7 @@ def admin_toggle_user_active(user_id):
     if current_user.id == user_id:
         return jsonify({'error': 'Cannot modify your own account status'}), 400
 
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
 
     try:
         user.is_active = not user.is_active
@@ -251,7 +276,7 @@ def admin_toggle_user_admin(user_id):
     if current_user.id == user_id:
         return jsonify({'error': 'Cannot modify your own admin status'}), 400
 
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
 
     try:
         user.is_admin = not user.is_admin
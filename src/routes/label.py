@@ -1,25 +1,63 @@
 """Blueprint for label management and note-label association endpoints."""
 
+import hashlib
 import logging
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_login import login_required, current_user
 from src.models.label import Label, NoteLabel, db
 from src.models.note import Note, SharedNote
-from sqlalchemy import or_, func
+from src.services.note_service import NOTE_LIST_LOAD_OPTIONS, get_note_and_share
+from src.websocket_events import socketio
+from sqlalchemy import and_, case, or_, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, selectinload
 
 logger = logging.getLogger(__name__)
 
 label_bp = Blueprint('label', __name__)
 
+# The given label and all of its ancestors. UNION (not UNION ALL) stops the walk
+# if stored data already contains a cycle.
+LABEL_ANCESTORS_SQL = text('''
+    WITH RECURSIVE ancestors(id, parent_id) AS (
+        SELECT id, parent_id FROM labels WHERE id = :label_id
+        UNION
+        SELECT labels.id, labels.parent_id
+        FROM labels JOIN ancestors ON labels.id = ancestors.parent_id
+    )
+    SELECT id FROM ancestors
+''')
+
 
 @label_bp.route('/labels', methods=['GET'])
 @login_required
 def get_labels():
     """Return all labels for the current user."""
     try:
-        labels = Label.query.filter_by(user_id=current_user.id).order_by(Label.name).all()
-        return jsonify([label.to_dict(include_hierarchy=True) for label in labels])
+        # The list changes rarely, so it is validated against a cheap aggregate
+        # first: a delete changes the count, any create or edit bumps
+        # max(updated_at). An unchanged list is answered with a bodiless 304.
+        count, last_updated = db.session.query(
+            func.count(Label.id), func.max(Label.updated_at)
+        ).filter_by(user_id=current_user.id).one()
+        etag = hashlib.md5(
+            f'{current_user.id}:{count}:{last_updated}'.encode(), usedforsecurity=False
+        ).hexdigest()
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            # Every label's parent is in this result (same user), so parents resolve
+            # from the identity map; children are batch-loaded in one IN query.
+            labels = Label.query.options(selectinload(Label.children)).filter_by(
+                user_id=current_user.id
+            ).order_by(Label.name).all()
+            response = jsonify([label.to_dict(include_hierarchy=True) for label in labels])
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         logger.exception('Error in label endpoint')
         return jsonify({'error': 'Internal server error'}), 500
@@ -36,16 +74,6 @@ def create_label():
         if not name:
             return jsonify({'error': 'Label name is required'}), 400
         
-        # Check for duplicate label names for this user
-        existing = Label.query.filter_by(
-            user_id=current_user.id,
-            name=name,
-            parent_id=data.get('parent_id')
-        ).first()
-        
-        if existing:
-            return jsonify({'error': 'Label with this name already exists'}), 400
-        
         # Validate parent_id if provided
         parent_id = data.get('parent_id')
         if parent_id:
@@ -66,6 +94,11 @@ def create_label():
         
         return jsonify(label.to_dict(include_hierarchy=True)), 201
         
+    except IntegrityError:
+        # Duplicate names under the same parent are rejected by the
+        # ux_labels_user_name_parent index (migration 019)
+        db.session.rollback()
+        return jsonify({'error': 'Label with this name already exists'}), 400
     except Exception as e:
         db.session.rollback()
         logger.exception('Error in label endpoint')
@@ -86,17 +119,6 @@ def update_label(label_id):
             if not new_name:
                 return jsonify({'error': 'Label name cannot be empty'}), 400
             
-            # Check for duplicate names (excluding current label)
-            existing = Label.query.filter(
-                Label.user_id == current_user.id,
-                Label.name == new_name,
-                Label.parent_id == label.parent_id,
-                Label.id != label_id
-            ).first()
-            
-            if existing:
-                return jsonify({'error': 'Label with this name already exists'}), 400
-            
             label.name = new_name
         
         if 'color' in data:
@@ -114,17 +136,11 @@ def update_label(label_id):
                 if parent_id == label_id:
                     return jsonify({'error': 'A label cannot be its own parent'}), 400
                 
-                # Check if the parent is a descendant of current label (would create a cycle)
-                def is_descendant(potential_parent, ancestor_id):
-                    if potential_parent.parent_id == ancestor_id:
-                        return True
-                    if potential_parent.parent_id:
-                        parent_label = Label.query.get(potential_parent.parent_id)
-                        if parent_label:
-                            return is_descendant(parent_label, ancestor_id)
-                    return False
+                # Check if the parent is a descendant of current label (would create a cycle):
+                # collect the new parent's ancestor chain in one recursive query.
+                ancestor_ids = db.session.execute(LABEL_ANCESTORS_SQL, {'label_id': parent.id}).scalars().all()
                 
-                if is_descendant(parent, label_id):
+                if label_id in ancestor_ids:
                     return jsonify({'error': 'Cannot create circular reference'}), 400
             
             label.parent_id = parent_id
@@ -132,6 +148,10 @@ def update_label(label_id):
         db.session.commit()
         return jsonify(label.to_dict(include_hierarchy=True))
         
+    except IntegrityError:
+        # Renaming or moving onto an existing sibling's name (migration 019)
+        db.session.rollback()
+        return jsonify({'error': 'Label with this name already exists'}), 400
     except Exception as e:
         db.session.rollback()
         logger.exception('Error in label endpoint')
@@ -169,7 +189,8 @@ def search_labels():
         if not query:
             return jsonify([])
         
-        # Search in label names (case insensitive)
+        # Search in label names (case insensitive). Root labels need no second
+        # query: any that match are already among these rows or past the limit.
         labels = Label.query.filter(
             Label.user_id == current_user.id,
             Label.name.ilike(f'%{query}%')
@@ -186,26 +207,7 @@ def search_labels():
                 'parent_id': label.parent_id
             })
         
-        # Also include parent labels that match
-        parent_labels = Label.query.filter(
-            Label.user_id == current_user.id,
-            Label.parent_id.is_(None),
-            Label.name.ilike(f'%{query}%')
-        ).order_by(Label.name).limit(5).all()
-        
-        for parent in parent_labels:
-            if not any(r['id'] == parent.id for r in results):
-                results.append({
-                    'id': parent.id,
-                    'name': parent.name,
-                    'display_name': parent.display_name,
-                    'full_name': parent.full_name,
-                    'color': parent.get_color(),
-                    'parent_id': parent.parent_id,
-                    'is_parent': True
-                })
-        
-        return jsonify(results[:10])
+        return jsonify(results)
         
     except Exception as e:
         logger.exception('Error in label endpoint')
@@ -217,11 +219,9 @@ def search_labels():
 def add_label_to_note(note_id):
     """Associate a label with a note."""
     try:
-        note = Note.query.get_or_404(note_id)
+        note, shared_note = get_note_and_share(note_id, current_user.id)
 
         if note.user_id != current_user.id:
-            from src.models.note import SharedNote
-            shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
             if not shared_note or shared_note.access_level != 'edit':
                 return jsonify({'error': 'Access denied'}), 403
 
@@ -235,12 +235,16 @@ def add_label_to_note(note_id):
         if not label:
             return jsonify({'error': 'Label not found'}), 404
 
-        existing = NoteLabel.query.filter_by(note_id=note_id, label_id=label_id).first()
-        if existing:
+        # Insert against the (note_id, label_id) primary key; an existing
+        # association is only read back when the insert was a no-op.
+        note_label = db.session.scalars(
+            sqlite_insert(NoteLabel).values(note_id=note_id, label_id=label_id)
+            .on_conflict_do_nothing().returning(NoteLabel)
+        ).first()
+        if note_label is None:
+            existing = db.session.get(NoteLabel, (note_id, label_id))
             return jsonify(existing.to_dict()), 200
 
-        note_label = NoteLabel(note_id=note_id, label_id=label_id)
-        db.session.add(note_label)
         db.session.commit()
 
         return jsonify(note_label.to_dict()), 201
@@ -256,11 +260,9 @@ def add_label_to_note(note_id):
 def remove_label_from_note(note_id, label_id):
     """Remove a label association from a note."""
     try:
-        note = Note.query.get_or_404(note_id)
+        note, shared_note = get_note_and_share(note_id, current_user.id)
 
         if note.user_id != current_user.id:
-            from src.models.note import SharedNote
-            shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
             if not shared_note or shared_note.access_level != 'edit':
                 return jsonify({'error': 'Access denied'}), 403
 
@@ -268,36 +270,17 @@ def remove_label_from_note(note_id, label_id):
         if not label:
             return jsonify({'error': f'Label {label_id} not found'}), 404
 
-        note_label = NoteLabel.query.filter(
-            NoteLabel.note_id == int(note_id),
-            NoteLabel.label_id == int(label_id)
-        ).first()
-
-        if not note_label:
+        # One DELETE; its rowcount says whether the association existed. The
+        # commit is what guarantees the row is gone, so no re-select afterwards.
+        deleted = NoteLabel.query.filter_by(note_id=note_id, label_id=label_id).delete(
+            synchronize_session=False
+        )
+        if not deleted:
             return jsonify({'message': 'Label was not associated with note'}), 200
 
-        association_id = note_label.id
-
-        db.session.delete(note_label)
-        db.session.flush()
-
-        verify_check = NoteLabel.query.get(association_id)
-        if verify_check:
-            db.session.rollback()
-            return jsonify({'error': 'Failed to delete association'}), 500
-
         db.session.commit()
 
-        final_check = NoteLabel.query.filter(
-            NoteLabel.note_id == int(note_id),
-            NoteLabel.label_id == int(label_id)
-        ).first()
-
-        if final_check:
-            return jsonify({'error': 'Association deletion failed - database inconsistency'}), 500
-
         try:
-            from src.websocket_events import socketio
             socketio.emit('label_removed', {
                 'note_id': note_id,
                 'label_id': label_id
@@ -321,18 +304,21 @@ def get_notes_by_label(label_id):
         # Verify label ownership
         label = Label.query.filter_by(id=label_id, user_id=current_user.id).first_or_404()
         
-        # Get notes with this label
-        notes = Note.query.join(NoteLabel).filter(
+        # Get notes with this label; the caller's share (if any) is outer-joined
+        # so access is decided per row via idx_shared_notes_note_user, and
+        # DISTINCT keeps one row per note if a share was ever duplicated.
+        notes = Note.query.options(*NOTE_LIST_LOAD_OPTIONS).join(NoteLabel).outerjoin(
+            SharedNote,
+            and_(SharedNote.note_id == Note.id, SharedNote.user_id == current_user.id)
+        ).filter(
             NoteLabel.label_id == label_id,
             or_(
                 Note.user_id == current_user.id,  # User's own notes
-                Note.id.in_(  # Or shared notes
-                    db.session.query(SharedNote.note_id).filter_by(user_id=current_user.id)
-                )
+                SharedNote.id.isnot(None)  # Or shared notes
             )
-        ).order_by(Note.updated_at.desc()).all()
+        ).distinct().order_by(Note.updated_at.desc()).all()
         
-        return jsonify([note.to_dict(current_user_id=current_user.id) for note in notes])
+        return jsonify([note.to_dict(current_user_id=current_user.id, redact=note.is_private) for note in notes])
         
     except Exception as e:
         logger.exception('Error in label endpoint')
@@ -344,31 +330,31 @@ def get_notes_by_label(label_id):
 def get_label_stats():
     """Return per-label note counts for the current user."""
     try:
-        # Get label counts
-        label_counts = db.session.query(
-            Label.id,
-            Label.name,
-            Label.display_name,
-            Label.color,
-            func.count(NoteLabel.id).label('note_count')
-        ).join(
-            NoteLabel, Label.id == NoteLabel.label_id, isouter=True
-        ).filter(
-            Label.user_id == current_user.id
-        ).group_by(Label.id).order_by(func.count(NoteLabel.id).desc()).all()
+        # Everything is computed in SQL: display_name is "Parent: Child" from a
+        # self-join (it is a Python property, so it can't be selected directly),
+        # and a NULL color falls back to the default for display.
+        parent = aliased(Label)
+        note_count = func.count(NoteLabel.note_id).label('note_count')
+        label_counts = db.session.execute(
+            select(
+                Label.id,
+                Label.name,
+                case(
+                    (parent.name.is_(None), Label.name),
+                    else_=parent.name + ': ' + Label.name
+                ).label('display_name'),
+                func.coalesce(Label.color, Label.DEFAULT_COLOR).label('color'),
+                note_count
+            ).outerjoin(
+                parent, Label.parent_id == parent.id
+            ).outerjoin(
+                NoteLabel, Label.id == NoteLabel.label_id
+            ).where(
+                Label.user_id == current_user.id
+            ).group_by(Label.id).order_by(note_count.desc())
+        ).mappings().all()
         
-        results = []
-        for label_id, name, display_name, color, count in label_counts:
-            results.append({
-                'id': label_id,
-                'name': name,
-                'display_name': display_name,
-                # color may be NULL (inherit); fall back to the default for display.
-                'color': color or Label.DEFAULT_COLOR,
-                'note_count': count
-            })
-        
-        return jsonify(results)
+        return jsonify([dict(row) for row in label_counts])
         
     except Exception as e:
         logger.exception('Error in label endpoint')
@@ -6,15 +6,20 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from src.models.note import Note, ChecklistItem, SharedNote, db
 from src.models.user import User
-from src.services.note_service import get_notes_for_user, create_note, update_note, delete_note, get_changes_for_user
+from src.services.note_service import get_notes_for_user, get_note_and_share, create_note, update_note, delete_note, get_changes_for_user, NOTE_LIST_LOAD_OPTIONS
 from src.websocket_events import broadcast_note_update, broadcast_checklist_toggle, broadcast_notes_reorder
 from src.datetime_utils import parse_iso_datetime, InvalidInput
+from src.geocoding import geocode
 from src.limiter import limiter
 from datetime import datetime
+from sqlalchemy import not_, update
+from sqlalchemy.orm import joinedload
 
 logger = logging.getLogger(__name__)
 
 note_bp = Blueprint('note', __name__)
+# Admin diagnostics; main.py registers this only when debug routes are enabled.
+note_debug_bp = Blueprint('note_debug', __name__)
 
 
 @note_bp.route('/geocode', methods=['GET'])
@@ -27,7 +32,6 @@ def geocode_address():
     respect its usage policy). Query param `q`. Returns a list of
     {name, latitude, longitude}.
     """
-    from src.geocoding import geocode
     query = request.args.get('q', '')
     try:
         results = geocode(query)
@@ -38,7 +42,7 @@ def geocode_address():
         return jsonify({'error': 'Location search is temporarily unavailable'}), 503
     return jsonify(results)
 
-@note_bp.route('/debug/auth', methods=['GET'])
+@note_debug_bp.route('/debug/auth', methods=['GET'])
 @login_required
 def debug_auth():
     """Return the current user's authentication status (admin only)."""
@@ -52,7 +56,7 @@ def debug_auth():
     })
 
 
-@note_bp.route('/debug/schema', methods=['GET'])
+@note_debug_bp.route('/debug/schema', methods=['GET'])
 @login_required
 def debug_schema():
     """Return the current database schema and migration history (admin only)."""
@@ -112,8 +116,7 @@ def sync_changes():
 def create_new_note():
     """Creates a new note."""
     data = request.json
-    note = create_note(current_user.id, data)
-    return jsonify(note.to_dict(current_user_id=current_user.id)), 201
+    return jsonify(create_note(current_user.id, data)), 201
 
 @note_bp.route('/notes/<int:note_id>', methods=['GET'])
 @login_required
@@ -123,10 +126,9 @@ def get_single_note(note_id):
     Private notes are returned redacted (title only, content withheld); use
     POST /notes/<id>/unlock with the PIN to retrieve full content.
     """
-    note = Note.query.get_or_404(note_id)
+    note, shared_note = get_note_and_share(note_id, current_user.id)
 
     if note.user_id != current_user.id:
-        shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
         if not shared_note:
             return jsonify({'error': 'Access denied'}), 403
 
@@ -142,10 +144,9 @@ def unlock_note(note_id):
     Per-note unlock: the PIN is checked on every call and nothing is persisted
     server-side, so each open re-verifies. Rate-limited to deter brute force.
     """
-    note = Note.query.get_or_404(note_id)
+    note, shared_note = get_note_and_share(note_id, current_user.id)
 
     if note.user_id != current_user.id:
-        shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
         if not shared_note:
             return jsonify({'error': 'Access denied'}), 403
 
@@ -164,8 +165,7 @@ def unlock_note(note_id):
 def update_existing_note(note_id):
     """Updates a note."""
     data = request.json
-    note = update_note(note_id, current_user.id, data)
-    return jsonify(note.to_dict(current_user_id=current_user.id))
+    return jsonify(update_note(note_id, current_user.id, data))
 
 @note_bp.route('/notes/<int:note_id>', methods=['DELETE'])
 @login_required
@@ -178,10 +178,9 @@ def delete_existing_note(note_id):
 @login_required
 def update_checklist_item(note_id, item_id):
     """Update a checklist item's text or completion state."""
-    note = Note.query.get_or_404(note_id)
+    note, shared_note = get_note_and_share(note_id, current_user.id)
 
     if note.user_id != current_user.id:
-        shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
         if not shared_note or shared_note.access_level != 'edit':
             return jsonify({'error': 'Access denied'}), 403
     
@@ -209,7 +208,7 @@ def update_checklist_item(note_id, item_id):
 @login_required
 def share_note(note_id):
     """Share a note with another user by username."""
-    note = Note.query.get_or_404(note_id)
+    note = db.get_or_404(Note, note_id)
 
     if note.user_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
@@ -255,14 +254,14 @@ def share_note(note_id):
 @login_required
 def get_note_shares(note_id):
     """Return all share records for a note."""
-    note = Note.query.get_or_404(note_id)
+    note, shared_note = get_note_and_share(note_id, current_user.id)
 
     if note.user_id != current_user.id:
-        shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
         if not shared_note:
             return jsonify({'error': 'Access denied'}), 403
 
-    shares = SharedNote.query.filter_by(note_id=note_id).all()
+    # Each share serializes its recipient; load them with the shares in one query.
+    shares = SharedNote.query.options(joinedload(SharedNote.user)).filter_by(note_id=note_id).all()
     return jsonify([share.to_dict() for share in shares])
 
 
@@ -270,7 +269,7 @@ def get_note_shares(note_id):
 @login_required
 def unshare_note(note_id, share_id):
     """Remove a share record, restricted to the note owner."""
-    note = Note.query.get_or_404(note_id)
+    note = db.get_or_404(Note, note_id)
 
     if note.user_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
@@ -291,21 +290,29 @@ def unshare_note(note_id, share_id):
 @login_required
 def toggle_shared_note_visibility(note_id, share_id):
     """Toggle whether the current user has hidden a note shared with them."""
-    share = SharedNote.query.filter_by(id=share_id, note_id=note_id).first_or_404()
-
-    if share.user_id != current_user.id:
-        return jsonify({'error': 'Access denied - you can only hide notes shared with you'}), 403
-
     data = request.json
-    hidden = data.get('hidden', not share.hidden_by_recipient)
+    hidden = data.get('hidden')
+
+    # One UPDATE both checks ownership of the share and flips (or sets) the
+    # flag; the share is only fetched to pick 404 vs 403 when nothing matched.
+    hidden = db.session.execute(
+        update(SharedNote)
+        .where(SharedNote.id == share_id, SharedNote.note_id == note_id, SharedNote.user_id == current_user.id)
+        .values(hidden_by_recipient=not_(SharedNote.hidden_by_recipient) if hidden is None else hidden)
+        .returning(SharedNote.hidden_by_recipient)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+    if hidden is None:
+        SharedNote.query.filter_by(id=share_id, note_id=note_id).first_or_404()
+        return jsonify({'error': 'Access denied - you can only hide notes shared with you'}), 403
 
-    share.hidden_by_recipient = hidden
     db.session.commit()
 
     return jsonify({
-        'share_id': share.id,
+        'share_id': share_id,
         'note_id': note_id,
-        'hidden': share.hidden_by_recipient,
+        'hidden': hidden,
         'message': 'Note hidden from your view' if hidden else 'Note restored to your view'
     })
 
@@ -316,12 +323,12 @@ def get_hidden_shared_notes():
     """Return all shared notes the current user has hidden."""
     user_id = current_user.id
 
-    hidden_notes_query = db.session.query(Note).join(SharedNote).filter(
+    hidden_notes_query = db.session.query(Note).options(*NOTE_LIST_LOAD_OPTIONS).join(SharedNote).filter(
         SharedNote.user_id == user_id,
         SharedNote.hidden_by_recipient == True
-    ).all()
+    ).distinct().all()
 
-    return jsonify([note.to_dict(current_user_id=current_user.id) for note in hidden_notes_query])
+    return jsonify([note.to_dict(current_user_id=current_user.id, redact=note.is_private) for note in hidden_notes_query])
 
 
 @note_bp.route('/notes/reorder', methods=['PUT'])
@@ -335,19 +342,25 @@ def reorder_notes():
         return jsonify({'error': 'No note IDs provided'}), 400
 
     try:
-        user_notes = Note.query.filter(
+        # The ownership check only needs (id, position) pairs, so no Note
+        # entities are built; the positions feed the change detection below.
+        current_positions = dict(db.session.query(Note.id, Note.position).filter(
             Note.id.in_(note_ids),
             Note.user_id == current_user.id
-        ).all()
+        ).all())
 
-        if len(user_notes) != len(note_ids):
+        if len(current_positions) != len(note_ids):
             return jsonify({'error': 'Some notes not found or access denied'}), 403
 
-        for position, note_id in enumerate(note_ids):
-            note = next((n for n in user_notes if n.id == note_id), None)
-            if note:
-                note.position = position
-
+        # Only rows whose position actually changes are written (and so get a new
+        # updated_at for delta sync), all in one executemany UPDATE.
+        changes = [
+            {'id': note_id, 'position': position}
+            for position, note_id in enumerate(note_ids)
+            if current_positions[note_id] != position
+        ]
+        if changes:
+            db.session.execute(update(Note), changes)
         db.session.commit()
 
         try:
@@ -377,10 +390,9 @@ def toggle_note_pin(note_id):
         return jsonify({'error': 'pinned field is required'}), 400
 
     try:
-        note = Note.query.get_or_404(note_id)
+        note, shared_note = get_note_and_share(note_id, current_user.id)
 
         if note.user_id != current_user.id:
-            shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
             if not shared_note or shared_note.access_level != 'edit':
                 return jsonify({'error': 'Access denied'}), 403
 
@@ -388,7 +400,6 @@ def toggle_note_pin(note_id):
         db.session.commit()
 
         try:
-            from src.websocket_events import broadcast_note_update
             broadcast_note_update(note_id, 'pinned', {
                 'pinned': pinned,
                 'user_id': current_user.id
@@ -413,10 +424,9 @@ def toggle_note_pin(note_id):
 def complete_reminder(note_id):
     """Mark a note's reminder as completed and clear any active snooze."""
     try:
-        note = Note.query.get_or_404(note_id)
+        note, shared_note = get_note_and_share(note_id, current_user.id)
 
         if note.user_id != current_user.id:
-            shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
             if not shared_note or shared_note.access_level != 'edit':
                 return jsonify({'error': 'Access denied'}), 403
 
@@ -450,10 +460,9 @@ def snooze_reminder(note_id):
         if not snooze_until:
             return jsonify({'error': 'snooze_until is required'}), 400
 
-        note = Note.query.get_or_404(note_id)
+        note, shared_note = get_note_and_share(note_id, current_user.id)
 
         if note.user_id != current_user.id:
-            shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
             if not shared_note or shared_note.access_level != 'edit':
                 return jsonify({'error': 'Access denied'}), 403
 
@@ -485,10 +494,9 @@ def snooze_reminder(note_id):
 def dismiss_reminder(note_id):
     """Dismiss a reminder notification for the current session without completing it."""
     try:
-        note = Note.query.get_or_404(note_id)
+        note, shared_note = get_note_and_share(note_id, current_user.id)
 
         if note.user_id != current_user.id:
-            shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user.id).first()
             if not shared_note:
                 return jsonify({'error': 'Access denied'}), 403
 
@@ -3,10 +3,36 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from src.models.user import User, db
+from sqlalchemy import or_
 
 user_bp = Blueprint('user', __name__)
 
 
+def _identity_conflict(username=None, email=None, exclude_id=None):
+    """Return the 409 message if username or email is taken by another user, else None.
+
+    Both are checked in one query; a username clash is reported first.
+    """
+    conditions = []
+    if username is not None:
+        conditions.append(User.username == username)
+    if email is not None:
+        conditions.append(User.email == email)
+    if not conditions:
+        return None
+
+    query = db.session.query(User.username, User.email).filter(or_(*conditions))
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    taken = query.all()
+
+    if username is not None and any(row.username == username for row in taken):
+        return 'Username already exists'
+    if taken:
+        return 'Email already exists'
+    return None
+
+
 @user_bp.route('/users', methods=['GET'])
 @login_required
 def get_users():
@@ -30,11 +56,9 @@ def create_user():
     if not data.get('username') or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Username, email, and password are required'}), 400
 
-    if User.get_by_username(data['username']):
-        return jsonify({'error': 'Username already exists'}), 409
-
-    if User.get_by_email(data['email']):
-        return jsonify({'error': 'Email already exists'}), 409
+    conflict = _identity_conflict(data['username'], data['email'])
+    if conflict:
+        return jsonify({'error': conflict}), 409
 
     try:
         user = User(
@@ -58,7 +82,7 @@ def get_user(user_id):
     if not current_user.is_admin and current_user.id != user_id:
         return jsonify({'error': 'Access denied'}), 403
 
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     return jsonify(user.to_dict())
 
 
@@ -69,20 +93,18 @@ def update_user(user_id):
     if not current_user.is_admin and current_user.id != user_id:
         return jsonify({'error': 'Access denied'}), 403
 
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     data = request.json
 
     try:
+        conflict = _identity_conflict(data.get('username'), data.get('email'), exclude_id=user.id)
+        if conflict:
+            return jsonify({'error': conflict}), 409
+
         if 'username' in data:
-            existing_user = User.get_by_username(data['username'])
-            if existing_user and existing_user.id != user.id:
-                return jsonify({'error': 'Username already exists'}), 409
             user.username = data['username']
 
         if 'email' in data:
-            existing_user = User.get_by_email(data['email'])
-            if existing_user and existing_user.id != user.id:
-                return jsonify({'error': 'Email already exists'}), 409
             user.email = data['email']
 
         if 'password' in data and data['password']:
@@ -111,7 +133,7 @@ def delete_user(user_id):
     if current_user.id == user_id:
         return jsonify({'error': 'Cannot delete your own account'}), 400
 
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
 
     try:
         db.session.delete(user)
@@ -136,16 +158,14 @@ def update_current_user():
     data = request.json
 
     try:
+        conflict = _identity_conflict(data.get('username'), data.get('email'), exclude_id=current_user.id)
+        if conflict:
+            return jsonify({'error': conflict}), 409
+
         if 'username' in data:
-            existing_user = User.get_by_username(data['username'])
-            if existing_user and existing_user.id != current_user.id:
-                return jsonify({'error': 'Username already exists'}), 409
             current_user.username = data['username']
 
         if 'email' in data:
-            existing_user = User.get_by_email(data['email'])
-            if existing_user and existing_user.id != current_user.id:
-                return jsonify({'error': 'Email already exists'}), 409
             current_user.email = data['email']
 
         if 'password' in data and data['password']:
@@ -1,16 +1,36 @@
 """Business logic for note operations including CRUD and real-time broadcast."""
 
 import logging
+from datetime import datetime
 
-from src.models.note import Note, ChecklistItem, SharedNote, db
+from src import attachments as storage
+from src.exceptions import ConflictError
+from src.models.label import Label, NoteLabel
+from src.models.note import Note, ChecklistItem, SharedNote, DeletedNote, db
 from src.models.user import User
-from src.websocket_events import broadcast_note_update, broadcast_checklist_toggle, broadcast_notes_reorder
+from src.websocket_events import socketio, _get_shared_user_ids, broadcast_note_update, broadcast_checklist_toggle, broadcast_notes_reorder
 from src.datetime_utils import parse_iso_datetime, InvalidInput
-from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import and_, or_
+from flask import abort
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy import and_, delete, insert, or_, select
 
 logger = logging.getLogger(__name__)
 
+# Loader options covering every relationship Note.to_dict() touches, so a list
+# of N notes serializes in a fixed number of queries instead of 1 + N per relation.
+# All are selectin loads: a joined load would repeat every note row per label.
+# Label.to_dict() walks the parent chain for names and inherited colors, so
+# parents are loaded level by level too. raiseload('*') makes any other Note
+# relationship fail loudly instead of lazy-loading once per note: when
+# to_dict() starts using a new relationship, add its eager load here.
+NOTE_LIST_LOAD_OPTIONS = (
+    selectinload(Note.checklist_items),
+    selectinload(Note.labels).selectinload(Label.parent, recursion_depth=-1),
+    selectinload(Note.shared_notes),
+    selectinload(Note.attachments),
+    raiseload('*'),
+)
+
 
 def _apply_location_reminder(note, data):
     """Apply location-reminder fields from a request payload onto a note.
@@ -56,6 +76,27 @@ def _validate_radius(value):
     return radius
 
 
+def get_note_and_share(note_id, user_id):
+    """Fetch a note and the user's share of it in one query.
+
+    Args:
+        note_id: The ID of the note.
+        user_id: The ID of the user whose access is being checked.
+
+    Returns:
+        A (note, share) tuple; share is None for the owner or a user without a
+        share. Aborts with 404 if the note doesn't exist.
+    """
+    row = db.session.execute(
+        select(Note, SharedNote).outerjoin(
+            SharedNote, and_(SharedNote.note_id == Note.id, SharedNote.user_id == user_id)
+        ).where(Note.id == note_id)
+    ).first()
+    if row is None:
+        abort(404)
+    return row[0], row[1]
+
+
 def get_notes_for_user(user_id):
     """Return all notes for a user, including notes shared with them.
 
@@ -66,24 +107,9 @@ def get_notes_for_user(user_id):
         A list of note dictionaries.
     """
     try:
-        notes_query = db.session.query(Note).options(
-            selectinload(Note.checklist_items),
-            joinedload(Note.labels),
-            selectinload(Note.shared_notes)
-        ).filter(
-            or_(
-                # User's own notes
-                Note.user_id == user_id,
-                # Notes shared with user (not hidden)
-                and_(
-                    Note.shared_notes.any(
-                        and_(
-                            SharedNote.user_id == user_id,
-                            SharedNote.hidden_by_recipient == False
-                        )
-                    )
-                )
-            )
+        # Owned and shared notes in one query (see _user_notes_access_filter)
+        notes_query = db.session.query(Note).options(*NOTE_LIST_LOAD_OPTIONS).filter(
+            _user_notes_access_filter(user_id)
         ).order_by(Note.pinned.desc(), Note.position.asc()).all()
 
     except Exception as e:
@@ -119,20 +145,12 @@ def get_changes_for_user(user_id, since):
         and 'server_time' (ISO string) the client should store as its next
         'since' cursor.
     """
-    from src.models.note import DeletedNote
-    from datetime import datetime
-
     # Capture the cursor BEFORE querying. A row updated in the tiny window
     # between now and the query runs would then be re-sent on the next sync
     # (a harmless duplicate) rather than being missed entirely.
     server_time = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')
 
-    changed_query = db.session.query(Note).options(
-        selectinload(Note.checklist_items),
-        joinedload(Note.labels),
-        selectinload(Note.shared_notes),
-        selectinload(Note.attachments),
-    ).filter(_user_notes_access_filter(user_id))
+    changed_query = db.session.query(Note).options(*NOTE_LIST_LOAD_OPTIONS).filter(_user_notes_access_filter(user_id))
 
     if since is not None:
         changed_query = changed_query.filter(Note.updated_at > since)
@@ -158,19 +176,11 @@ def get_changes_for_user(user_id, since):
 
 def _get_notes_for_user_legacy(user_id):
     """Fallback note query for older database schemas missing hidden_by_recipient."""
-    own_notes = Note.query.options(
-        selectinload(Note.checklist_items),
-        joinedload(Note.labels),
-        selectinload(Note.shared_notes)
-    ).filter_by(user_id=user_id).order_by(Note.pinned.desc(), Note.position.asc()).all()
+    own_notes = Note.query.options(*NOTE_LIST_LOAD_OPTIONS).filter_by(user_id=user_id).order_by(Note.pinned.desc(), Note.position.asc()).all()
 
     shared_note_ids = db.session.query(SharedNote.note_id).filter_by(user_id=user_id).all()
     if shared_note_ids:
-        shared_notes_query = Note.query.options(
-            selectinload(Note.checklist_items),
-            joinedload(Note.labels),
-            selectinload(Note.shared_notes)
-        ).filter(Note.id.in_([id[0] for id in shared_note_ids])).all()
+        shared_notes_query = Note.query.options(*NOTE_LIST_LOAD_OPTIONS).filter(Note.id.in_([id[0] for id in shared_note_ids])).all()
     else:
         shared_notes_query = []
 
@@ -179,6 +189,67 @@ def _get_notes_for_user_legacy(user_id):
     return [note.to_dict(current_user_id=user_id, redact=note.is_private) for note in all_notes.values()]
 
 
+def _insert_checklist_items(note_id, items):
+    """Insert a note's checklist items, in the given order, as one executemany.
+
+    Rows are written without building ORM objects; callers that read the
+    note's checklist_items afterwards must not rely on a loaded collection.
+    """
+    if not items:
+        return
+    db.session.execute(insert(ChecklistItem), [
+        {
+            'note_id': note_id,
+            'text': item_data['text'],
+            'completed': item_data.get('completed', False),
+            'order': i,
+            'category': item_data.get('category'),
+        }
+        for i, item_data in enumerate(items)
+    ])
+
+
+def _owned_label_ids(user_id, label_ids):
+    """Return the subset of label_ids owned by the user, checked in one query."""
+    if not label_ids:
+        return set()
+    return set(db.session.scalars(
+        select(Label.id).where(Label.user_id == user_id, Label.id.in_(label_ids))
+    ))
+
+
+def _add_note_labels(note_id, user_id, label_ids):
+    """Attach the given labels to a note, skipping any the user doesn't own.
+
+    Duplicates in label_ids collapse to a single association.
+    """
+    db.session.add_all(
+        NoteLabel(note_id=note_id, label_id=label_id)
+        for label_id in _owned_label_ids(user_id, label_ids)
+    )
+
+
+def _set_note_labels(note_id, user_id, label_ids):
+    """Make the user's owned labels among label_ids the note's only labels.
+
+    Only associations that actually change are deleted or inserted.
+    """
+    current_ids = set(db.session.scalars(
+        select(NoteLabel.label_id).where(NoteLabel.note_id == note_id)
+    ))
+    wanted_ids = _owned_label_ids(user_id, label_ids)
+
+    stale_ids = current_ids - wanted_ids
+    if stale_ids:
+        db.session.execute(
+            delete(NoteLabel).where(NoteLabel.note_id == note_id, NoteLabel.label_id.in_(stale_ids))
+        )
+    db.session.add_all(
+        NoteLabel(note_id=note_id, label_id=label_id)
+        for label_id in wanted_ids - current_ids
+    )
+
+
 def create_note(user_id, data):
     """Create a new note for the given user.
 
@@ -187,7 +258,7 @@ def create_note(user_id, data):
         data: A dictionary containing the note's data.
 
     Returns:
-        The newly created note object.
+        The note serialized for user_id (the same dict that is broadcast).
     """
     # Idempotent create: if the client supplied a client_id and a note with it
     # already exists for this user, return that note instead of creating a
@@ -196,7 +267,7 @@ def create_note(user_id, data):
     if client_id:
         existing = Note.query.filter_by(user_id=user_id, client_id=client_id).first()
         if existing:
-            return existing
+            return existing.to_dict(current_user_id=user_id)
 
     max_position = db.session.query(db.func.max(Note.position)).filter_by(user_id=user_id).scalar()
     next_position = (max_position or -1) + 1
@@ -226,29 +297,17 @@ def create_note(user_id, data):
     db.session.flush()
 
     if note.note_type == 'checklist' and 'checklist_items' in data:
-        for i, item_data in enumerate(data['checklist_items']):
-            item = ChecklistItem(
-                note_id=note.id,
-                text=item_data['text'],
-                completed=item_data.get('completed', False),
-                order=i,
-                category=item_data.get('category')
-            )
-            db.session.add(item)
+        _insert_checklist_items(note.id, data['checklist_items'])
 
     if 'label_ids' in data and data['label_ids']:
-        from src.models.label import Label, NoteLabel
-        for label_id in data['label_ids']:
-            label = Label.query.filter_by(id=label_id, user_id=user_id).first()
-            if label:
-                note_label = NoteLabel(note_id=note.id, label_id=label_id)
-                db.session.add(note_label)
+        _add_note_labels(note.id, user_id, data['label_ids'])
 
     db.session.commit()
 
-    broadcast_note_update(note.id, 'created', note.to_dict(current_user_id=user_id))
+    note_dict = note.to_dict(current_user_id=user_id)
+    broadcast_note_update(note.id, 'created', note_dict)
 
-    return note
+    return note_dict
 
 
 def update_note(note_id, current_user_id, data):
@@ -260,15 +319,15 @@ def update_note(note_id, current_user_id, data):
         data: A dictionary containing the updated note data.
 
     Returns:
-        The updated note object.
+        The updated note serialized for current_user_id (the same dict that
+        is broadcast).
 
     Raises:
         PermissionError: If the user does not have permission to update the note.
     """
-    note = Note.query.get_or_404(note_id)
+    note, shared_note = get_note_and_share(note_id, current_user_id)
 
     if note.user_id != current_user_id:
-        shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user_id).first()
         if not shared_note:
             raise PermissionError('Access denied')
 
@@ -287,7 +346,6 @@ def update_note(note_id, current_user_id, data):
         # Compare at second resolution: to_dict serializes updated_at without
         # microseconds, so a client echoing that value must not false-conflict.
         if base and note.updated_at.replace(microsecond=0) > base.replace(microsecond=0):
-            from src.exceptions import ConflictError
             raise ConflictError(
                 'Note was modified elsewhere',
                 current=note.to_dict(current_user_id=current_user_id),
@@ -314,26 +372,14 @@ def update_note(note_id, current_user_id, data):
 
     if note.note_type == 'checklist' and 'checklist_items' in data:
         ChecklistItem.query.filter_by(note_id=note_id).delete()
-        for i, item_data in enumerate(data['checklist_items']):
-            item = ChecklistItem(
-                note_id=note_id,
-                text=item_data['text'],
-                completed=item_data.get('completed', False),
-                order=i,
-                category=item_data.get('category')
-            )
-            db.session.add(item)
+        _insert_checklist_items(note_id, data['checklist_items'])
 
     if 'label_ids' in data:
-        from src.models.label import Label, NoteLabel
-        NoteLabel.query.filter_by(note_id=note_id).delete()
-        if data['label_ids']:
-            for label_id in data['label_ids']:
-                label = Label.query.filter_by(id=label_id, user_id=current_user_id).first()
-                if label:
-                    note_label = NoteLabel(note_id=note_id, label_id=label_id)
-                    db.session.add(note_label)
+        _set_note_labels(note_id, current_user_id, data['label_ids'])
 
+    # The bulk deletes and FK-only inserts above bypass the note's collections;
+    # with expire_on_commit off they must be reloaded explicitly.
+    db.session.expire(note, ['checklist_items', 'labels'])
     db.session.commit()
 
     try:
@@ -347,7 +393,7 @@ def update_note(note_id, current_user_id, data):
     except Exception as e:
         logger.warning("Error broadcasting update: %s", e)
 
-    return note
+    return note_dict
 
 
 def delete_note(note_id, current_user_id):
@@ -360,22 +406,19 @@ def delete_note(note_id, current_user_id):
     Raises:
         PermissionError: If the user does not have permission to delete the note.
     """
-    note = Note.query.get_or_404(note_id)
+    note, shared_note = get_note_and_share(note_id, current_user_id)
 
     if note.user_id != current_user_id:
-        shared_note = SharedNote.query.filter_by(note_id=note_id, user_id=current_user_id).first()
         if shared_note:
             raise PermissionError('Cannot delete shared notes - only the owner can delete. Use "Hide from my view" instead.')
         else:
             raise PermissionError('Access denied - only the owner can delete this note')
 
     # Collect affected user IDs before deleting (relationships unavailable after commit).
-    from src.websocket_events import _get_shared_user_ids
     affected_user_ids = _get_shared_user_ids(note_id)
 
     # Write a tombstone per affected user so clients that were offline during
     # the delete can discover it via delta-sync (GET /api/sync).
-    from src.models.note import DeletedNote
     for uid in affected_user_ids:
         db.session.add(DeletedNote(note_id=note_id, user_id=uid))
 
@@ -385,13 +428,11 @@ def delete_note(note_id, current_user_id):
     # The DB cascade removes attachment rows, but the on-disk files are ours to
     # clean up. Do this after commit so a failed delete doesn't lose files.
     try:
-        from src import attachments as storage
         storage.delete_note_dir(note_id)
     except Exception as e:
         logger.warning("Error removing attachment files for note %s: %s", note_id, e)
 
     try:
-        from src.websocket_events import socketio
         payload = {'note_id': note_id, 'update_type': 'deleted', 'data': {'id': note_id}}
         for uid in affected_user_ids:
             socketio.emit('note_update_received', payload, room=f'user_{uid}')
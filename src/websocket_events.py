@@ -10,12 +10,14 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
 from flask_login import current_user
 
+from src.json_provider import OrjsonPacketJSON
+
 
 def _get_shared_user_ids(note_id):
     """Return list of user IDs that have access to note_id (owner + shared recipients)."""
     try:
-        from src.models.note import Note, SharedNote
-        note = Note.query.get(note_id)
+        from src.models.note import Note, db
+        note = db.session.get(Note, note_id)
         if not note:
             return []
         ids = [note.user_id]
@@ -26,7 +28,10 @@ def _get_shared_user_ids(note_id):
         return []
 
 
-socketio = SocketIO(cors_allowed_origins="*")
+# Allowed origins are supplied by main.py's init_app() from ALLOWED_ORIGIN, so no
+# wildcard here. Both loggers stay off: they log every packet on the hot path,
+# and packets are encoded with orjson when it is installed.
+socketio = SocketIO(logger=False, engineio_logger=False, json=OrjsonPacketJSON)
 
 # Structure: {session_id: {'user_id': int, 'notes': set(note_ids)}}
 active_connections = {}
@@ -45,6 +50,9 @@ def handle_connect():
     if not current_user.is_authenticated:
         return False  # Reject the connection
     active_connections[request.sid] = {'user_id': current_user.id, 'notes': set()}
+    # Joined here as well as on join_user so user-scoped emits never miss a
+    # socket; rooms are left automatically on disconnect.
+    join_room(f'user_{current_user.id}')
 
 
 @socketio.on('disconnect')
@@ -163,7 +171,7 @@ def handle_note_shared(data):
 
 @socketio.on('notes_reordered')
 def handle_notes_reordered(data):
-    """Broadcast note reorder events to all other clients of the same user."""
+    """Send note reorder events to the user's other clients (their user room)."""
     user_id = _authenticated_user_id()
     note_ids = data.get('note_ids')
 
@@ -173,7 +181,7 @@ def handle_notes_reordered(data):
     emit('notes_reorder_received', {
         'user_id': user_id,
         'note_ids': note_ids
-    }, broadcast=True, include_self=False)
+    }, room=f'user_{user_id}', include_self=False)
 
 
 def broadcast_note_update(note_id, update_type, data, exclude_user=None):